@@ -0,0 +1,291 @@
+import os
+
+# no progress bars while timing (tqdm reads
+# this when imported, so it is set first):
+os.environ.setdefault('TQDM_DISABLE', '1')
+
+from benchmarks.suite import BENCHMARKS, SIZES, NETWORKS, Fixtures  # noqa: E402
+
+from colorito.utils.logs import setup_logger
+
+from datetime import datetime
+
+import subprocess
+import statistics
+import platform
+import argparse
+import timeit
+import torch
+import numpy
+import json
+import sys
+import re
+
+
+BENCHMARKS_DIR = os.path.split(os.path.abspath(__file__))[0]
+
+defaults = {
+    'output': os.path.join(BENCHMARKS_DIR, 'results.json'),
+    'baseline': os.path.join(BENCHMARKS_DIR, 'baseline.json'),
+    'threshold': .25,
+    'repeat': 5,
+    'network': 'lite'
+}
+
+logger = setup_logger('benchmarks')
+
+
+def run(
+    select=None,
+    sizes=tuple(SIZES),
+    networks=tuple(NETWORKS),
+    network=defaults['network'],
+    repeat=defaults['repeat']
+):
+    """
+    Times the benchmarks of the suite: each case is
+    run as many times as it takes to last at least
+    0.2s (see `timeit.Timer.autorange`), `repeat`
+    times, and the time per run is recorded (its
+    median and minimum across repeats).
+
+    Cases whose setup fails (e.g. a network that
+    is missing) are recorded as skipped.
+
+    :param select: regex the benchmark keys (e.g.
+                   `palette.search.n[1m]`) must match.
+    :param sizes: palette sizes to run at.
+    :param networks: networks to run with.
+    :param network: network of the palettes.
+    :param repeat:
+    :return:
+    """
+    fixtures = Fixtures(network=network)
+
+    results = {}
+    for benchmark in BENCHMARKS:
+        for key, size, network_ in benchmark.cases(sizes, networks):
+            if select and not re.search(select, key):
+                continue
+
+            try:
+                function = benchmark.setup(fixtures, size, network_)
+            except Exception as ex:
+                logger.warning(f' skipping {key}: {ex}')
+                results[key] = {'skipped': str(ex)}
+                continue
+
+            timer = timeit.Timer(function)
+            number, _ = timer.autorange()
+            timings = [
+                timing / number for timing in
+                timer.repeat(repeat=repeat, number=number)
+            ]
+
+            results[key] = {
+                'median_s': statistics.median(timings),
+                'min_s': min(timings),
+                'number': number,
+                'repeat': repeat
+            }
+            logger.info(f' {key}: {_format(results[key]["median_s"])}')
+
+    fixtures.close()
+
+    return {'meta': _meta(network), 'results': results}
+
+
+def compare(results, baseline, threshold=defaults['threshold']):
+    """
+    Compares the median times of the results with
+    the baseline's: a case is a regression if it
+    is slower by more than `threshold` (relative).
+
+    :param results:
+    :param baseline:
+    :param threshold:
+    :return: rows of the comparison, and the keys of
+             the regressions.
+    """
+    rows, regressions = [], []
+    for key, result in results['results'].items():
+        reference = baseline['results'].get(key, {})
+        if 'median_s' not in result or 'median_s' not in reference:
+            continue
+
+        ratio = result['median_s'] / reference['median_s']
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+            regressions.append(key)
+        elif ratio < 1 / (1 + threshold):
+            status = 'faster'
+        else:
+            status = 'ok'
+
+        rows.append([
+            key,
+            _format(reference['median_s']),
+            _format(result['median_s']),
+            f'{ratio:.2f}x',
+            status
+        ])
+
+    return rows, regressions
+
+
+def _meta(network):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=BENCHMARKS_DIR,
+            capture_output=True,
+            text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'time': datetime.utcnow().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'threads': torch.get_num_threads(),
+        'network': network
+    }
+
+
+def _format(seconds):
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.1f}us'
+    if seconds < 1:
+        return f'{seconds * 1e3:.2f}ms'
+
+    return f'{seconds:.3f}s'
+
+
+def _log_table(rows):
+    columns = ['benchmark', 'baseline', 'current', 'ratio', 'status']
+    cells = [columns] + rows
+    widths = [max(len(row[i]) for row in cells) for i in range(len(columns))]
+
+    for row in cells:
+        logger.info(' ' + '  '.join(
+            cell.ljust(width) for cell, width in zip(row, widths)
+        ))
+
+
+def argument_parser():
+
+    parser = argparse.ArgumentParser(
+        description='Colorito benchmarks: time the'
+                    ' hot paths, and compare them '
+                    'with a baseline!'
+    )
+    parser.add_argument(
+        '-k',
+        '--select',
+        default=None,
+        help='Regex the keys of the benchmarks '
+             'to run must match (e.g. search)'
+    )
+    parser.add_argument(
+        '-s',
+        '--sizes',
+        default=','.join(SIZES),
+        help=f'Comma-separated palette sizes, a'
+             f'mong: {", ".join(SIZES)}'
+    )
+    parser.add_argument(
+        '-n',
+        '--networks',
+        default=','.join(NETWORKS),
+        help=f'Comma-separated networks, among:'
+             f' {", ".join(NETWORKS)}'
+    )
+    parser.add_argument(
+        '--network',
+        default=defaults['network'],
+        choices=list(NETWORKS),
+        help='Network the palettes are built on'
+    )
+    parser.add_argument(
+        '-r',
+        '--repeat',
+        default=defaults['repeat'],
+        type=int,
+        help='Number of timed repeats per case'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        default=defaults['output'],
+        help='Path where the results are saved '
+             '(as JSON)'
+    )
+    parser.add_argument(
+        '-b',
+        '--baseline',
+        default=defaults['baseline'],
+        help='Path of the baseline results to '
+             'compare with'
+    )
+    parser.add_argument(
+        '--save_baseline',
+        action='store_true',
+        help='Save the results as the baseline'
+             ', rather than comparing them'
+    )
+    parser.add_argument(
+        '-t',
+        '--threshold',
+        default=defaults['threshold'],
+        type=float,
+        help='Relative slowdown over the basel'
+             'ine that is a regression'
+    )
+
+    return parser
+
+
+if __name__ == '__main__':
+
+    args = argument_parser().parse_args()
+
+    results = run(
+        select=args.select,
+        sizes=args.sizes.split(','),
+        networks=args.networks.split(','),
+        network=args.network,
+        repeat=args.repeat
+    )
+
+    output = args.baseline if args.save_baseline else args.output
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f' results saved to {output}')
+
+    if args.save_baseline:
+        sys.exit(0)
+
+    if not os.path.isfile(args.baseline):
+        logger.info(
+            f' no baseline found at {args.baseline}: save'
+            f' one with --save_baseline to compare with'
+        )
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    rows, regressions = compare(results, baseline, args.threshold)
+    _log_table(rows)
+
+    if regressions:
+        logger.info(
+            f' {len(regressions)} regression(s), over a'
+            f' {args.threshold:.0%} threshold: {", ".join(regressions)}'
+        )
+        sys.exit(1)
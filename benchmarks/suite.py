@@ -0,0 +1,275 @@
+from colorito import COLORS, DEFAULT_PALETTE, DEFAULT_NETWORK, LITE_NETWORK
+from colorito.utils import Reader
+from colorito.colors import Color
+from colorito.data.vectorize import NgramVectorizer
+from colorito.data.utils import clean, encode
+from colorito.nnet.model import ColorGenerator
+from colorito.nnet.registry import models
+from colorito.index import FlatIndex
+from colorito.palette import SmartPalette
+
+from functools import lru_cache
+
+import random
+import torch
+import os
+
+
+# palette sizes: the HTML palette's, then synthetic
+# palettes of names made up of the words of the
+# bundled color names:
+SIZES = {
+    'html': None,
+    '1k': 1000,
+    '10k': 10000,
+    '100k': 100000,
+    '1m': 1000000
+}
+
+NETWORKS = {
+    'base': DEFAULT_NETWORK,
+    'lite': LITE_NETWORK
+}
+
+# `clean` runs spaCy on all the names at once,
+# that caps the text it parses (to 1M chars),
+# so whatever cleans names is run up to 10k:
+CLEANED = ('html', '1k', '10k')
+
+# palettes larger than this are grown from one
+# of this size, with perturbed embeddings (as
+# their names could not be cleaned at once):
+INDEXED = 10000
+
+QUERY = 'dark sky blue'
+
+BENCHMARKS = []
+
+
+class Benchmark(object):
+    """
+    A timed operation: `setup` prepares (untimed)
+    the inputs of a run, and returns the function
+    to time, for each size (and network).
+    """
+
+    def __init__(self, name, setup, sizes, networks):
+        self.name = name
+        self.setup = setup
+        self.sizes = sizes
+        self.networks = networks
+
+    def cases(self, sizes, networks):
+        """
+        Lists the (key, size, network) cases to run
+        among the requested sizes and networks.
+
+        :param sizes:
+        :param networks:
+        :return:
+        """
+        for size in self.sizes or [None]:
+            if size is not None and size not in sizes:
+                continue
+
+            for network in self.networks or [None]:
+                if network is not None and network not in networks:
+                    continue
+
+                args = ','.join(arg for arg in (network, size) if arg)
+                yield f'{self.name}[{args}]' if args else self.name, size, network
+
+
+def benchmark(name, sizes=tuple(SIZES), networks=None):
+    """
+    Registers a benchmark's setup function, called
+    with the `Fixtures`, the size and the network.
+
+    :param name:
+    :param sizes: None if the size does not matter.
+    :param networks: None if no network is needed.
+    :return:
+    """
+    def register(setup):
+        BENCHMARKS.append(Benchmark(name, setup, sizes, networks))
+        return setup
+
+    return register
+
+
+class Fixtures(object):
+    """
+    Inputs shared by the benchmarks, built once.
+    """
+
+    def __init__(self, network='lite'):
+        """
+        :param network: the network palettes use.
+        """
+        self.network = network
+
+    @lru_cache(maxsize=None)
+    def names(self, size):
+        """
+        The names of a palette of the given size.
+
+        :param size:
+        :return:
+        """
+        if SIZES[size] is None:
+            return list(Reader.read(DEFAULT_PALETTE))
+
+        words = sorted({
+            word for fi in sorted(os.listdir(COLORS)) if fi.endswith('.csv')
+            for name in list(Reader.read(os.path.join(COLORS, fi)))[1:]
+            for word in name.lower().split() if word.isalpha()
+        })
+
+        generator = random.Random(0)
+        return [
+            ' '.join(generator.sample(words, generator.randint(1, 3)))
+            for _ in range(SIZES[size])
+        ]
+
+    @lru_cache(maxsize=None)
+    def cleaned(self, size):
+        return list(clean(self.names(size)))
+
+    @lru_cache(maxsize=None)
+    def nnet(self, network):
+        return ColorGenerator.load(NETWORKS[network])
+
+    @lru_cache(maxsize=None)
+    def vectorizer(self, network):
+        nnet = self.nnet(network)
+
+        vectorz = NgramVectorizer(order=len(nnet.encoder.lexicons_))
+        vectorz.lexicons = nnet.encoder.lexicons_
+
+        return vectorz
+
+    @lru_cache(maxsize=None)
+    def encoded(self, size, network):
+        return encode(self.names(size), self.vectorizer(network))
+
+    @lru_cache(maxsize=None)
+    def palette(self, size):
+        """
+        A SmartPalette of the given size (on the
+        palettes' network).
+
+        :param size:
+        :return:
+        """
+        if SIZES[size] is None or SIZES[size] <= INDEXED:
+            return SmartPalette(self.names(size), nnet=NETWORKS[self.network])
+
+        base = self.palette('10k')
+        n = SIZES[size]
+
+        palette = SmartPalette.__new__(SmartPalette)
+        palette.__dict__.update(base.__dict__)
+
+        ix = torch.arange(n) % len(base.names)
+        generator = torch.Generator().manual_seed(0)
+        embeddings = base.embeddings.codes[ix]
+        for chunk in embeddings.split(INDEXED):
+            chunk.add_(torch.randn(chunk.size(), generator=generator), alpha=.05)
+
+        palette.names = [f'{base.names[i]} {k}' for k, i in enumerate(ix.tolist())]
+        palette.index = {
+            name: base.index[base.names[i]]
+            for name, i in zip(palette.names, ix.tolist())
+        }
+        palette.embeddings = FlatIndex(embeddings)
+
+        return palette
+
+    def close(self):
+        self.palette.cache_clear()
+        models.clear()
+
+
+@benchmark('clean', sizes=CLEANED)
+def _clean(fixtures, size, network):
+    names = fixtures.names(size)
+    return lambda: list(clean(names))
+
+
+@benchmark('vectorizer.fit', sizes=('html', '1k', '10k', '100k'))
+def _fit(fixtures, size, network):
+    names = fixtures.cleaned(size) if size in CLEANED else fixtures.names(size)
+    return lambda: NgramVectorizer(order=3).fit(names)
+
+
+@benchmark('vectorizer.transform', sizes=('html', '1k', '10k', '100k'))
+def _transform(fixtures, size, network):
+    names = fixtures.cleaned(size) if size in CLEANED else fixtures.names(size)
+
+    vectorz = NgramVectorizer(order=3)
+    vectorz.fit(names)
+
+    return lambda: vectorz.transform(names)
+
+
+@benchmark('encode', sizes=CLEANED, networks=tuple(NETWORKS))
+def _encode(fixtures, size, network):
+    vectorz = fixtures.vectorizer(network)
+    names = fixtures.names(size)
+    return lambda: encode(names, vectorz)
+
+
+@benchmark('nnet.h', sizes=CLEANED, networks=tuple(NETWORKS))
+def _h(fixtures, size, network):
+    nnet = fixtures.nnet(network)
+    x = fixtures.encoded(size, network)
+    return lambda: nnet.h(x)
+
+
+@benchmark('nnet.y', sizes=CLEANED, networks=tuple(NETWORKS))
+def _y(fixtures, size, network):
+    nnet = fixtures.nnet(network)
+    x = fixtures.encoded(size, network)
+    return lambda: nnet.y(x)
+
+
+@benchmark('palette.index_colors', sizes=CLEANED)
+def _index_colors(fixtures, size, network):
+    palette = fixtures.palette(size)
+    return lambda: palette._index_colors()
+
+
+@benchmark('palette.search.n')
+def _search_n(fixtures, size, network):
+    palette = fixtures.palette(size)
+    return lambda: palette.search(QUERY, n=10)
+
+
+@benchmark('palette.search.t')
+def _search_t(fixtures, size, network):
+    palette = fixtures.palette(size)
+    return lambda: palette.search(QUERY, t=.9)
+
+
+@benchmark('palette.search.knee')
+def _search_knee(fixtures, size, network):
+    palette = fixtures.palette(size)
+    return lambda: palette.search(QUERY)
+
+
+@benchmark('palette.invent', sizes=None)
+def _invent(fixtures, size, network):
+    palette = fixtures.palette('html')
+    return lambda: palette.invent(QUERY)
+
+
+@benchmark('color.from_lab', sizes=None)
+def _from_lab(fixtures, size, network):
+    labs = torch.rand(1000, 3, generator=torch.Generator().manual_seed(0)).tolist()
+    return lambda: [Color.from_lab('', l, a, b, unscale=True) for l, a, b in labs]
+
+
+@benchmark('color.rgb_lab', sizes=None)
+def _rgb_lab(fixtures, size, network):
+    colors = [entry['color'] for entry in fixtures.palette('html').index.values()]
+    return lambda: [(color.rgb, color.lab) for color in colors]
@@ -1,10 +1,16 @@
 from colorito.colors import Color
 from colorito.utils.logs import setup_logger
 from colorito.data.utils import clean
+from colorito.data.lexicon import CompactLexicon
 
 from torch.utils.data import Dataset
 from torch.nn.utils.rnn import pad_sequence
 
+import numpy as np
+import hashlib
+import tempfile
+import shutil
+import pickle
 import torch
 import os
 
@@ -17,37 +23,80 @@ class ColorDataset(Dataset):
         self,
         colors,
         vectorizer,
-        space='lab'
+        space='lab',
+        jobs=1,
+        fit=True
     ):
         self.vectorizer = vectorizer
         self.colorspace = space
+        self.jobs = jobs
+        self.fit = fit
 
         x, y = self._process(colors)
 
-        assert {len(_) for _ in y} == {3}, 'data points\' labels are not colors'
+        assert y.size(-1) == 3, 'data points\' labels are not colors'
         assert len(x) == len(y), 'different number of data points and of labels'
 
-        x = list(
-            pad_sequence(
-                self._vectors(x),
-                batch_first=True
-            )
+        x = pad_sequence(
+            self._vectors(x),
+            batch_first=True
         )
 
-        assert len({len(_) for _ in x}) == 1, 'data points have different sizes'
+        self._assign(x, y)
 
-        self.x = x
-        self.y = y
+    def _assign(self, x, y, lengths=None):
+        """
+        Sets the (padded) vectorized names and their
+        labels as the data points of the dataset.
+
+        :param x:
+        :param y:
+        :param lengths:
+        :return:
+        """
+        assert len(x) == len(y), 'different number of data points and of labels'
+
+        # indexes of n-grams are stored as
+        # int32 - the encoders cast them to
+        # long before embedding them.
+        self.x = x.int()
+        self.y = y.float()
 
         self.xlen = len(
               self.x[0])
 
+        # elements of padding have all-zero
+        # features, and only come at the end.
+        if lengths is None:
+            lengths = (self.x != 0).any(dim=-1).sum(dim=-1)
+
+        self.lengths = lengths
+
     def __getitem__(self, idx):
         return self.x[idx], self.y[idx]
 
     def __len__(self):
         return len(self.x)
 
+    @staticmethod
+    def collate(batch):
+        """
+        Stacks the data points of a batch, padding
+        them to the length of the longest sequence
+        in the batch, rather than to `xlen`.
+
+        :param batch:
+        :return:
+        """
+        x, y = zip(*batch)
+
+        x = torch.stack(x)
+        y = torch.stack(y)
+
+        length = (x != 0).any(dim=-1).sum(dim=-1).max()
+
+        return x[:, :max(1, length.item())], y
+
     def _process(self, colors):
         """
         Cleans colors' names, unifies colors
@@ -61,90 +110,135 @@ class ColorDataset(Dataset):
         logger.info(
             f' got {len(colors)} colors...'
         )
-        names = clean([color.name for color in colors])
-        labels = [
+        names = np.array(list(
+            clean([color.name for color in colors])
+        ))
+        labels = torch.stack([
             self._color_to_space(
                            color) for color in colors
-        ]
-        colors = zip(
-            names,
-            labels
-        )
+        ]).float()
 
         logger.info(' de-duplicating colors...')
 
-        unique = {}
-        counts = {}
-        for name, val in colors:
-            if name not in unique:
-                unique[name] = []
-                counts[name] = {}
-
-            val_as_string = ", ".join([
-                f'{v}' for v in val.tolist()
-            ])
+        # stable name ids, in order of first appearance:
 
-            unique[name].append(val)
-            counts[name][val_as_string] = counts[name].get(
-                                          val_as_string, 0) + 1
+        _, first, name_ids = np.unique(
+            names,
+            return_index=True,
+            return_inverse=True
+        )
+        rank = np.empty(len(first), dtype=np.int64)
+        rank[np.argsort(first)] = np.arange(len(first))
+        name_ids = rank[name_ids.reshape(-1)]
+
+        # labels are keyed by the bits of their
+        # coordinates, then each (name, label)
+        # pair is counted:
+
+        pairs = np.column_stack([
+            name_ids,
+            labels.numpy().view(np.int32)
+        ])
+        pairs, pair_first, pair_counts = np.unique(
+            pairs,
+            axis=0,
+            return_index=True,
+            return_counts=True
+        )
 
         # take as label for duplicated colors, the one that ap-
-        # pears with highest frequency, breaking ties randomly:
-
-        unique = {
-            k: torch.tensor([
-                float(s)
-                for s in sorted(
-                    counts[k].items(),
-                    key=lambda t: t[1]
-                )[-1][0].split( ", " )
-            ])
-            for k, v in unique.items()
-        }
+        # pears with highest frequency, breaking ties in favour
+        # of the label that appeared last for the first time:
+
+        by_name = np.lexsort((pair_first, pair_counts, pairs[:, 0]))
+        is_last = np.append(
+            pairs[by_name[1:], 0] != pairs[by_name[:-1], 0], True)
+
+        chosen = pair_first[by_name[is_last]]
 
         logger.info(
-            f' there are {len(unique)} samples'
+            f' there are {len(chosen)} samples'
             f' left after the de-duplication. '
         )
 
         return (
-            list(unique.keys( )),
-            list(unique.values())
+            names[chosen].tolist(),
+            labels[chosen]
         )
 
     def _vectors(self, strings):
-        self.vectorizer.fit(strings)
+        if self.fit:
+            self.vectorizer.fit(strings, jobs=self.jobs)
         return self.vectorizer.torch_transform(
-                                       strings)
+                           strings, jobs=self.jobs)
 
     def _color_to_space(self, color):
-        if self.colorspace == 'lab':
+        return self.to_space(color, self.colorspace)
+
+    @staticmethod
+    def to_space(color, space):
+        if space == 'lab':
             return torch.tensor(color.rescaled_lab)
-        if self.colorspace == 'rgb':
+        if space == 'rgb':
             return torch.tensor(color.rescaled_rgb)
 
         raise ValueError(
             f'Invalid color space'
-            f' {self.colorspace} '
+            f' {space} '
             f'- must be either:  '
             f'`lab` or `rgb`'
         )
 
     @classmethod
-    def build(cls, cdir, vectorizer, space='lab'):
+    def build(
+        cls,
+        cdir,
+        vectorizer,
+        space='lab',
+        jobs=1,
+        cache=None,
+        fit=True
+    ):
         """
         Builds the dataset given a directory con-
         taining csv files with color names and t-
-        heir hexadecimal codes.
+        heir hexadecimal codes. Set `jobs` > 1 to
+        vectorize names with a pool of processes.
+
+        If `cache` is a directory, the processed
+        dataset (and the vectorizer's lexicons) is
+        stored there, keyed by the content of the
+        csv files and by the vectorizer settings;
+        following builds with the same data and
+        settings memory-map it from there.
+
+        Set `fit` to False to vectorize names with
+        the lexicons the vectorizer already has (e.g.
+        those of a trained model), as they are.
 
         :param cdir:
         :param vectorizer:
         :param space:
+        :param jobs:
+        :param cache:
+        :param fit:
         :return:
         """
 
         logger.info(f' gathering data from {cdir}...')
 
+        csvs = [
+            os.path.join(cdir, fi) for fi in
+            sorted(os.listdir(cdir))
+            if fi.endswith('.csv')
+        ]
+
+        if cache is not None:
+            cached = os.path.join(cache, cls._cache_key(
+                                csvs, vectorizer, space, fit))
+            if os.path.isdir(cached):
+                return cls._load(cached, vectorizer, space)
+
         def read_csv(csvpath):
 
             with open(csvpath, 'r') as csv:
@@ -162,14 +256,119 @@ class ColorDataset(Dataset):
             return read_colors
 
         colors = []
-        for fi in os.listdir(cdir):
-            if fi.endswith('.csv'):
-                fi = os.path.join(cdir, fi)
-                fi_colors = read_csv(fi)
-                colors.extend(fi_colors)
+        for fi in csvs:
+            fi_colors = read_csv(fi)
+            colors.extend(fi_colors)
 
-        return cls(
+        dataset = cls(
             colors,
             vectorizer,
-            space=space
+            space=space,
+            jobs=jobs,
+            fit=fit
+        )
+
+        if cache is not None:
+            dataset._save(cached)
+
+        return dataset
+
+    @staticmethod
+    def _cache_key(csvs, vectorizer, space, fit=True):
+        """
+        Hashes the content of the csv files, the
+        settings of the vectorizer (and its lexi-
+        cons, if not fitted) and the color space
+        into the name of a cache entry.
+
+        :param csvs:
+        :param vectorizer:
+        :param space:
+        :param fit:
+        :return:
+        """
+        key = hashlib.sha1()
+        for csvpath in csvs:
+            key.update(os.path.basename(csvpath).encode('utf-8'))
+            with open(csvpath, 'rb') as csv:
+                key.update(csv.read())
+
+        key.update(repr(sorted(
+            vectorizer.settings().items()
+        )).encode('utf-8'))
+        key.update(space.encode('utf-8'))
+
+        if not fit:
+            key.update(pickle.dumps(CompactLexicon.compact(
+                                     vectorizer.lexicons)))
+
+        return key.hexdigest()
+
+    def _save(self, to):
+        """
+        Stores the dataset in a cache entry: one
+        .npy file per array, and the vectorizer's
+        lexicons. The entry is written in a temp-
+        orary directory and moved in place once
+        complete.
+
+        :param to:
+        :return:
+        """
+        logger.info(f' caching the dataset to {to}...')
+
+        parent = os.path.dirname(os.path.abspath(to))
+        os.makedirs(parent, exist_ok=True)
+
+        tmp = tempfile.mkdtemp(dir=parent)
+        np.save(os.path.join(tmp, 'x.npy'), self.x.numpy())
+        np.save(os.path.join(tmp, 'y.npy'), self.y.numpy())
+        np.save(os.path.join(tmp, 'lengths.npy'), self.lengths.numpy())
+
+        with open(os.path.join(tmp, 'lexicons.pl'), 'wb') as f:
+            pickle.dump(CompactLexicon.compact(
+                         self.vectorizer.lexicons), f)
+
+        try:
+            os.rename(tmp, to)
+        except OSError:
+            # another process cached it first:
+            shutil.rmtree(tmp)
+
+    @classmethod
+    def _load(cls, from_, vectorizer, space):
+        """
+        Memory-maps a dataset from a cache entry,
+        and restores the vectorizer's lexicons.
+
+        :param from_:
+        :param vectorizer:
+        :param space:
+        :return:
+        """
+        logger.info(f' loading the cached dataset from {from_}...')
+
+        def _mmap(fname):
+            # copy-on-write mapping: pages are shared
+            # until (if ever) they're written to.
+            return torch.from_numpy(np.load(
+                os.path.join(from_, fname), mmap_mode='c'
+            ))
+
+        with open(os.path.join(from_, 'lexicons.pl'), 'rb') as f:
+            vectorizer.lexicons = pickle.load(f)
+        vectorizer.invert()
+
+        dataset = cls.__new__(cls)
+        dataset.vectorizer = vectorizer
+        dataset.colorspace = space
+        dataset.jobs = 1
+        dataset.fit = False
+
+        dataset._assign(
+            _mmap('x.npy'),
+            _mmap('y.npy'),
+            lengths=_mmap('lengths.npy')
         )
+
+        return dataset
@@ -0,0 +1,329 @@
+import zlib
+import string
+import numpy as np
+
+
+class CompactLexicon(object):
+    """
+    Array-backed, read-only replacement of the dict
+    lexicons built by `NgramVectorizer.fit`. Each n-
+    gram is packed into an integer (one base-`BASE`
+    digit per character of `ALPHABET`); codes are k-
+    ept sorted in a NumPy array, along with the ids
+    they map to, so that lookups are a vectorized b-
+    inary search. N-grams that can not be packed (s-
+    pecial `#`/`?` entries of higher order lexicons,
+    or characters outside of the alphabet) are kept
+    in a small dict.
+
+    Exposes the same read API of a dict (`len`, `in`,
+    `[]`, `get`, `items`), so it can be used wherever
+    a lexicon is expected.
+    """
+
+    PAD = '#'
+    UNK = '?'
+
+    ALPHABET = f'#{string.ascii_lowercase} <>'
+    BASE = len(ALPHABET)
+
+    # largest order whose codes fit in an int64:
+    MAX_ORDER = int(np.log(2 ** 63 - 1) / np.log(BASE))
+
+    def __init__(self, codes, ids, order, extra=None):
+        """
+        Builds the lexicon from sorted `codes`, the
+        `ids` they are mapped to and the dict with
+        the entries that could not be packed.
+
+        :param codes:
+        :param ids:
+        :param order:
+        :param extra:
+        """
+        self.order = order
+        self.codes = np.asarray(codes, dtype=self._dtype(order))
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.extra = dict(extra or {})
+
+        if len(self.codes) != len(self.ids):
+            raise ValueError(
+                f'Got {len(self.codes)} codes but '
+                f'{len(self.ids)} ids - must match.'
+            )
+
+        self.unk = self.get(self.UNK)
+
+    @classmethod
+    def from_dict(cls, lexicon):
+        """
+        Packs a dict lexicon (n-gram to index).
+
+        :param lexicon:
+        :return:
+        """
+        order = max(len(ngram) for ngram in lexicon)
+
+        ngrams = [
+            ngram for ngram in lexicon
+            if cls._packable(ngram, order)
+        ]
+        extra = {
+            ngram: ix for ngram, ix in lexicon.items()
+            if not cls._packable(ngram, order)
+        }
+
+        codes = cls.pack(ngrams, order)
+        ids = np.array([lexicon[ngram] for ngram in ngrams],
+                       dtype=np.int64)
+
+        sorted_ix = np.argsort(codes)
+
+        return cls(
+            codes[sorted_ix],
+            ids[sorted_ix],
+            order,
+            extra=extra
+        )
+
+    @classmethod
+    def compact(cls, lexicons):
+        """
+        Packs a list of lexicons, leaving alone
+        those that are not plain dicts.
+
+        :param lexicons:
+        :return:
+        """
+        return [
+            cls.from_dict(lexicon)
+            if isinstance(lexicon, dict)
+            else lexicon for lexicon in lexicons
+        ]
+
+    @classmethod
+    def pack(cls, ngrams, order):
+        """
+        Maps n-grams of length `order` to their inte-
+        ger codes. N-grams with characters outside of
+        the alphabet are mapped to -1.
+
+        :param ngrams:
+        :param order:
+        :return:
+        """
+        if not ngrams:
+            return np.zeros(0, dtype=np.int64)
+
+        chars = np.frombuffer(
+            ''.join(ngrams).encode('ascii', 'replace'),
+            dtype=np.uint8
+        ).reshape(-1, order)
+
+        digits = cls._digits()[chars]
+        powers = cls.BASE ** np.arange(
+            order - 1, -1, -1, dtype=np.int64)
+
+        codes = digits @ powers
+        codes[(digits < 0).any(axis=1)] = -1
+
+        return codes
+
+    @classmethod
+    def unpack(cls, code, order):
+        """
+        Rebuilds the n-gram from its code.
+
+        :param code:
+        :param order:
+        :return:
+        """
+        chars = []
+        for _ in range(order):
+            code, digit = divmod(int(code), cls.BASE)
+            chars.append(cls.ALPHABET[digit])
+
+        return ''.join(reversed(chars))
+
+    def lookup(self, ngrams):
+        """
+        Maps a list of n-grams to their indexes (or
+        to the index of `?` if they are not in the
+        lexicon) at once.
+
+        :param ngrams:
+        :return:
+        """
+        ngrams = list(ngrams)
+        if self.order > self.MAX_ORDER or not all(
+            len(ngram) == self.order for ngram in ngrams
+        ):
+            return np.array([self.get(ngram, self.unk)
+                             for ngram in ngrams], dtype=np.int64)
+
+        ids = np.full(len(ngrams), self.unk, dtype=np.int64)
+        if not ngrams:
+            return ids
+
+        codes = self.pack(ngrams, self.order)
+        packed = codes >= 0
+
+        if len(self.codes):
+            at = np.searchsorted(self.codes, codes)
+            at = np.minimum(at, len(self.codes) - 1)
+            found = packed & (self.codes[at] == codes)
+            ids[found] = self.ids[at[found]]
+
+        for ix in np.flatnonzero(~packed):
+            ids[ix] = self.extra.get(ngrams[ix], self.unk)
+
+        return ids
+
+    def get(self, ngram, default=None):
+        if ngram in self.extra:
+            return self.extra[ngram]
+
+        if self._packable(ngram, self.order):
+            code = self.pack([ngram], self.order)[0]
+            at = np.searchsorted(self.codes, code)
+            if at < len(self.codes) and self.codes[at] == code:
+                return int(self.ids[at])
+
+        return default
+
+    def items(self):
+        for code, ix in zip(self.codes, self.ids):
+            yield self.unpack(code, self.order), int(ix)
+
+        for ngram, ix in self.extra.items():
+            yield ngram, ix
+
+    def keys(self):
+        for ngram, _ in self.items():
+            yield ngram
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __getitem__(self, ngram):
+        ix = self.get(ngram)
+        if ix is None:
+            raise KeyError(ngram)
+
+        return ix
+
+    def __contains__(self, ngram):
+        return self.get(ngram) is not None
+
+    def __iter__(self):
+        return self.keys()
+
+    def __len__(self):
+        return len(self.codes) + len(self.extra)
+
+    @classmethod
+    def _packable(cls, ngram, order):
+        return (
+            len(ngram) == order and
+            order <= cls.MAX_ORDER and
+            all(char in cls.ALPHABET for char in ngram)
+        )
+
+    @classmethod
+    def _dtype(cls, order):
+        # smallest integer type that fits the codes:
+        if cls.BASE ** order <= np.iinfo(np.int32).max:
+            return np.int32
+
+        return np.int64
+
+    @classmethod
+    def _digits(cls):
+        digits = np.full(256, -1, dtype=np.int64)
+        for i, char in enumerate(cls.ALPHABET):
+            digits[ord(char)] = i
+
+        return digits
+
+
+class HashedLexicon(object):
+    """
+    Stateless lexicon that maps n-grams to one of
+    a fixed number of buckets with the hashing tr-
+    ick: no n-gram is ever unknown, and memory do-
+    es not grow with the vocabulary. Bucket zero
+    is reserved for the `#` PAD symbol.
+
+    Exposes the lookup API of `CompactLexicon`.
+    """
+
+    PAD = '#'
+    UNK = '?'
+
+    def __init__(self, order, buckets):
+        """
+        Builds a lexicon for n-grams of the spe-
+        cified order, hashing them to `buckets`.
+
+        :param order:
+        :param buckets:
+        """
+        if buckets < 2:
+            raise ValueError(
+                f'Got an invalid number of buckets'
+                f' ({buckets}) - must be > 1...'
+            )
+
+        self.order = order
+        self.buckets = buckets
+
+    def lookup(self, ngrams):
+        """
+        Maps a list of n-grams to their buckets at
+        once; n-grams are packed as in `CompactLe-
+        xicon` and their codes are hashed, n-grams
+        that can not be packed are hashed by crc32.
+
+        :param ngrams:
+        :return:
+        """
+        ngrams = list(ngrams)
+
+        codes = np.full(len(ngrams), -1, dtype=np.int64)
+        if ngrams and self.order <= CompactLexicon.MAX_ORDER and all(
+            len(ngram) == self.order for ngram in ngrams
+        ):
+            codes = CompactLexicon.pack(ngrams, self.order)
+
+        hashes = self._mix(codes.astype(np.uint64))
+        for ix in np.flatnonzero(codes < 0):
+            hashes[ix] = zlib.crc32(ngrams[ix].encode('utf-8'))
+
+        ids = (hashes % np.uint64(self.buckets - 1)).astype(np.int64) + 1
+        ids[[ngram == self.PAD for ngram in ngrams]] = 0
+
+        return ids
+
+    def get(self, ngram, default=None):
+        return int(self.lookup([ngram])[0])
+
+    def __getitem__(self, ngram):
+        return self.get(ngram)
+
+    def __contains__(self, ngram):
+        return True
+
+    def __len__(self):
+        return self.buckets
+
+    @staticmethod
+    def _mix(codes):
+        # splitmix64 finalizer, so that close
+        # codes land on far away buckets:
+        codes = codes ^ (codes >> np.uint64(30))
+        codes = codes * np.uint64(0xbf58476d1ce4e5b9)
+        codes = codes ^ (codes >> np.uint64(27))
+        codes = codes * np.uint64(0x94d049bb133111eb)
+        codes = codes ^ (codes >> np.uint64(31))
+
+        return codes
@@ -0,0 +1,98 @@
+from torch.utils.data import Sampler
+
+import torch
+
+
+class BucketBatchSampler(Sampler):
+
+    def __init__(
+        self,
+        lengths,
+        batch_size,
+        shuffle=True,
+        pool=50,
+        seed=0,
+        replicas=1,
+        rank=0
+    ):
+        """
+        Batch sampler that groups sequences of si-
+        milar length in the same batch, so that ea-
+        ch batch can be padded to its own longest
+        sequence (see `ColorDataset.collate`).
+
+        Indexes are shuffled, split in pools of `p-
+        ool` batches, and sorted by length within
+        each pool before being cut into batches; the
+        order of the batches is then shuffled too.
+        Shuffling is seeded by `seed` and by the e-
+        poch (see `set_epoch`).
+
+        When training on `replicas` processes, each
+        process gets one every `replicas` batches
+        (starting from its `rank`); batches are re-
+        peated so that all processes get as many.
+
+        :param lengths: length of each sequence.
+        :param batch_size:
+        :param shuffle:
+        :param pool: number of batches per pool.
+        :param seed:
+        :param replicas:
+        :param rank:
+        """
+        super(BucketBatchSampler, self).__init__()
+
+        self.lengths = torch.as_tensor(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.pool = pool
+        self.seed = seed
+        self.epoch = 0
+        self.replicas = replicas
+        self.rank = rank
+
+    def set_epoch(self, epoch):
+        """
+        Sets the epoch, so that each epoch is
+        shuffled differently (but in the same
+        way for all replicas).
+
+        :param epoch:
+        :return:
+        """
+        self.epoch = epoch
+
+    def __iter__(self):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+
+        if self.shuffle:
+            indexes = torch.randperm(len(self.lengths), generator=generator)
+        else:
+            indexes = torch.arange(len(self.lengths))
+
+        batches = []
+        for pool in indexes.split(self.batch_size * self.pool):
+            by_length = self.lengths[pool].argsort(
+                         descending=True, stable=True)
+            batches.extend(pool[by_length].split(self.batch_size))
+
+        if self.shuffle:
+            batches = [
+                batches[i] for i in
+                torch.randperm(len(batches), generator=generator)
+            ]
+
+        batches += batches[:len(self) * self.replicas - len(batches)]
+
+        for batch in batches[self.rank::self.replicas]:
+            yield batch.tolist()
+
+    def __len__(self):
+        pool_size = self.batch_size * self.pool
+        full_pools, rest = divmod(len(self.lengths), pool_size)
+
+        batches = full_pools * self.pool + -(-rest // self.batch_size)
+
+        return -(-batches // self.replicas)
@@ -0,0 +1,226 @@
+from colorito.colors import Color
+from colorito.utils.logs import setup_logger
+from colorito.data.utils import clean
+from colorito.data.dataset import ColorDataset
+
+from torch.utils.data import IterableDataset, get_worker_info
+
+import random
+import torch
+import os
+
+logger = setup_logger('stream')
+
+
+class ColorStream(IterableDataset):
+
+    def __init__(
+        self,
+        csvs,
+        vectorizer,
+        length,
+        space='lab',
+        buffer=0,
+        chunk=1024,
+        seed=0,
+        replicas=1,
+        rank=0
+    ):
+        """
+        Streams data points from csv files with co-
+        lor names and their hexadecimal codes, wit-
+        hout ever holding the whole corpus in memo-
+        ry: lines are read lazily, and names are c-
+        leaned, vectorized and labelled in chunks,
+        inside the DataLoader's workers.
+
+        Files are split among workers - of all the
+        `replicas` training processes (or, if the-
+        re are less files than workers, their lines
+        are), and data points are shuffled through
+        a buffer of `buffer` elements (no shuffling
+        if zero). Unlike `ColorDataset`, names are
+        not de-duplicated.
+
+        The vectorizer has to be fitted beforehand
+        (e.g. over `names()`), or to be a `Hashing-
+        Vectorizer`. Names are padded (or trimmed)
+        to `length` elements.
+
+        :param csvs: directory or list of csv files.
+        :param vectorizer:
+        :param length:
+        :param space:
+        :param buffer: size of the shuffle buffer.
+        :param chunk: names processed at once.
+        :param seed:
+        :param replicas: number of training processes.
+        :param rank: rank of this training process.
+        """
+        super(ColorStream, self).__init__()
+
+        if isinstance(csvs, str):
+            csvs = [
+                os.path.join(csvs, fi) for fi in
+                sorted(os.listdir(csvs))
+                if fi.endswith('.csv')
+            ]
+
+        self.csvs = list(csvs)
+        self.vectorizer = vectorizer
+        self.colorspace = space
+        self.length = length
+        self.buffer = buffer
+        self.chunk = chunk
+        self.seed = seed
+        self.epoch = 0
+        self.replicas = replicas
+        self.rank = rank
+
+        # times this copy of the stream was it-
+        # erated: persistent workers keep their
+        # copy, which `set_epoch` can't update.
+        self.iterations = 0
+
+    def set_epoch(self, epoch):
+        """
+        Sets the epoch, so that each epoch is
+        shuffled differently.
+
+        :param epoch:
+        :return:
+        """
+        self.epoch = epoch
+
+    def names(self):
+        """
+        Yields the cleaned names of all colors in
+        the stream (e.g. to fit the vectorizer).
+
+        :return:
+        """
+        for colors in self._chunks(self._colors(shard=False)):
+            for name in clean([color.name for color in colors]):
+                yield name
+
+    def __iter__(self):
+        n_workers, worker_id = self._worker()
+
+        rng = random.Random(hash((
+            self.seed,
+            self.epoch,
+            self.iterations,
+            worker_id
+        )))
+        self.iterations += 1
+
+        data_points = self._data_points(self._colors())
+        if not self.buffer:
+            yield from data_points
+            return
+
+        # shuffle buffer: once full, each new
+        # data point takes the place of a ra-
+        # ndom one, that is yielded instead.
+        buffer = []
+        for data_point in data_points:
+            if len(buffer) < self.buffer:
+                buffer.append(data_point)
+                continue
+
+            at = rng.randrange(self.buffer)
+            buffer[at], data_point = data_point, buffer[at]
+            yield data_point
+
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def _colors(self, shard=True):
+        """
+        Lazily parses the colors of the files (or of
+        the lines) assigned to the current worker, or
+        of all the files if not `shard`.
+
+        :param shard:
+        :return:
+        """
+        n_workers, worker_id = self._worker() if shard else (1, 0)
+
+        if len(self.csvs) >= n_workers:
+            csvs = self.csvs[worker_id::n_workers]
+            n_workers, worker_id = 1, 0
+        else:
+            csvs = self.csvs
+
+        at = 0
+        for csvpath in csvs:
+            logger.info(
+                f' streaming samples from {csvpath}...'
+            )
+            with open(csvpath, 'r') as csv:
+                next(csv, None)  # header
+                for line in csv:
+                    line = line.rstrip('\n')
+                    if not line:
+                        continue
+
+                    if at % n_workers == worker_id:
+                        yield Color(*line.split(','))
+                    at += 1
+
+    def _worker(self):
+        """
+        Returns the number of workers across all
+        replicas, and the id of the current one.
+
+        :return:
+        """
+        worker = get_worker_info()
+        n_workers = worker.num_workers if worker is not None else 1
+        worker_id = worker.id if worker is not None else 0
+
+        return (
+            n_workers * self.replicas,
+            self.rank * n_workers + worker_id
+        )
+
+    def _chunks(self, colors):
+        chunk = []
+        for color in colors:
+            chunk.append(color)
+            if len(chunk) == self.chunk:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    def _data_points(self, colors):
+        """
+        Cleans, vectorizes and labels colors one
+        chunk at a time.
+
+        :param colors:
+        :return:
+        """
+        for colors in self._chunks(colors):
+            names = list(clean([color.name for color in colors]))
+            vectors = self.vectorizer.torch_transform(names)
+
+            for name, x, color in zip(names, vectors, colors):
+                if not name:
+                    continue
+
+                yield (
+                    self._pad(x),
+                    ColorDataset.to_space(
+                        color, self.colorspace).float()
+                )
+
+    def _pad(self, x):
+        x = x[:self.length].int()
+        padded = torch.zeros(
+            (self.length, x.size(-1)), dtype=x.dtype)
+        padded[:len(x)] = x
+
+        return padded
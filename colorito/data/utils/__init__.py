@@ -49,10 +49,16 @@ def encode(strings, vectorizer):
         strings
     ]).reshape(-1).tolist( )
     strings = clean(strings)
+
+    return vectorize(strings, vectorizer)
+
+
+def vectorize(strings, vectorizer):
+    # cleaned strings to a padded batch:
     tensors = vectorizer.torch_transform(strings)
     tensors = pad_sequence(
         list(tensors),
-        batch_first=1.
+        batch_first=True
     )
 
     return tensors
@@ -1,3 +1,8 @@
+from colorito.data.lexicon import CompactLexicon, HashedLexicon
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 from tqdm import tqdm
 
 import string
@@ -86,38 +91,93 @@ class NgramVectorizer(object):
             for ngram in self._ngrams(word, order):
                 yield ngram
 
-    def fit(self, strings):
+    def fit(self, strings, jobs=1):
         """
         Builds lexicons for n-grams up to
         the order specified at initializa-
         tion.
 
+        If `jobs` > 1, strings are split in
+        shards, whose n-grams are collected
+        by a pool of `jobs` processes. Sha-
+        rds are merged in order, so n-grams
+        get the same ids of a serial fit.
+
         :param strings:
+        :param jobs:
         :return:
         """
-        for string in tqdm(strings):
-
-            # build 1-gram, 2-gram, 3-gram...
-            # up to self.order-gram lexicons.
+        # lexicons are grown in place, so
+        # compact ones are unpacked first:
+        self.lexicons = [
+            lexicon if isinstance(lexicon, dict)
+            else lexicon.to_dict( ) for lexicon
+            in self.lexicons
+        ]
 
-            max_order = self.ngramorder + 1
-            for order in range(1, max_order):
-                lexicon = self.lexicons[order - 1]
-                for ngram in self.n_grams(string,
-                                          order):
-                    if ngram not in lexicon:
-                        lexicon[ngram] = len(lexicon)
+        if jobs > 1:
+            # each shard yields its n-grams in
+            # order of first occurrence, for e-
+            # ach order, so adding them in sha-
+            # rds' order is the same as a seri-
+            # al pass over the strings.
+            shards = _in_pool(
+                _fit_shard, strings, jobs,
+                NgramVectorizer(self.ngramorder,
+                                bound=self.word_bound)
+            )
+            for n_grams_by_order in tqdm(shards):
+                for lexicon, n_grams in zip(self.lexicons,
+                                            n_grams_by_order):
+                    for ngram in n_grams:
+                        if ngram not in lexicon:
+                            lexicon[ngram] = len(lexicon)
+        else:
+            for string in tqdm(strings):
+
+                # build 1-gram, 2-gram, 3-gram...
+                # up to self.order-gram lexicons.
+
+                max_order = self.ngramorder + 1
+                for order in range(1, max_order):
+                    lexicon = self.lexicons[order - 1]
+                    for ngram in self.n_grams(string,
+                                              order):
+                        if ngram not in lexicon:
+                            lexicon[ngram] = len(lexicon)
         # add `UNK`
         for lexicon in self.lexicons:
             lexicon.update({'?': len(lexicon)})
 
+        self.invert()
+
+    def invert(self):
+        """
+        Builds the inverted lexicons (index to
+        n-gram) used to translate vectors back.
+
+        :return:
+        """
         self.inverted = [{
             ix: ngram for ngram ,
             ix in lexicon.items()
         } for lexicon in
             self.lexicons]
 
-    def transform(self, strings, **kwargs):
+    def settings(self):
+        """
+        Returns the settings that determine how
+        strings are vectorized (lexicons aside).
+
+        :return:
+        """
+        return {
+            'vectorizer': self.__class__.__name__,
+            'order': self.ngramorder,
+            'bound': self.word_bound
+        }
+
+    def transform(self, strings, jobs=1, **kwargs):
         """
         Transforms the passed list of strings into
         a list of matrices, where each matrix repr-
@@ -138,7 +198,11 @@ class NgramVectorizer(object):
         he first character, row two from the seco-
         nd, and so on.
 
+        If `jobs` > 1, strings are transformed in
+        shards by a pool of `jobs` processes.
+
         :param strings:
+        :param jobs:
         :param max_order:
         :return:
         """
@@ -151,36 +215,52 @@ class NgramVectorizer(object):
                 f'to be between 1 and {self.ngramorder}.'
             )
 
+        if jobs > 1:
+            return [
+                vector for vectors in _in_pool(
+                    partial(_transform_shard, max_order=max_order),
+                    strings, jobs, self
+                ) for vector in vectors
+            ]
+
         max_order += 1
 
-        vectors = []
-        for string in strings:
-            # collect n-grams for each order
-            # first row contains string's 1-
-            # grams, second row 2-grams, th-
-            # ird of 3-grams, and so on.
-            n_grams_by_order = [
-                list(self.n_grams(string, order))
-                for order in range(1, max_order)
-            ]
-            # map each ngram to its lexicon's
-            # index and transpose - now first
-            # row contains indexes of all the
-            # n-grams up to self.ngramorder f-
-            # or the first string's character,
-            # the second row it's the same bu-
-            # t for the second character:
-            #   e.g. `hello`
-            #     1st row: index of `h`, `he`, `hel`, ...
-            #     2nd row: index of `e`, `el`, `ell`, ...
-            #   where the length of each row is max_order
-            n_grams = np.array([
-                np.array([
-                    self._find(ngram, i + 1) for ngram in ngrams
-                ])  for i, ngrams in enumerate(n_grams_by_order)
-            ])
+        strings = list(strings)
 
-            vectors.append(self._t(n_grams))
+        # collect n-grams for each order
+        # first row contains string's 1-
+        # grams, second row 2-grams, th-
+        # ird of 3-grams, and so on.
+        n_grams_by_order = [
+            [list(self.n_grams(string, order)) for string in strings]
+            for order in range(1, max_order)
+        ]
+        # map all the n-grams of the same o-
+        # rder to their lexicon's index at o-
+        # nce, then split them back by string
+        indexes_by_order = [
+            self._split(
+                self._lookup(
+                    [ngram for ngrams in n_grams for ngram in ngrams],
+                    order
+                ),
+                [len(ngrams) for ngrams in n_grams]
+            )
+            for order, n_grams in enumerate(n_grams_by_order, 1)
+        ]
+        # transpose - now first row contains
+        # indexes of all the n-grams up to s-
+        # elf.ngramorder for the first strin-
+        # g's character, the second row it's
+        # the same but for the second chara-
+        # cter:
+        #   e.g. `hello`
+        #     1st row: index of `h`, `he`, `hel`, ...
+        #     2nd row: index of `e`, `el`, `ell`, ...
+        #   where the length of each row is max_order
+        vectors = [
+            self._t(n_grams) for n_grams in zip(*indexes_by_order)
+        ]
 
         return vectors
 
@@ -259,6 +339,26 @@ class NgramVectorizer(object):
         """
         return self.translate(tensors.numpy())
 
+    def compact(self):
+        """
+        Replaces the lexicons with their array-backed
+        version (see `CompactLexicon`), that takes a
+        fraction of the memory and is faster to pick-
+        le, and supports vectorized lookups.
+
+        :return:
+        """
+        self.lexicons = CompactLexicon.compact(
+                                self.lexicons)
+        return self
+
+    @staticmethod
+    def _split(indexes, lengths):
+        if not lengths:
+            return []
+
+        return np.split(indexes, np.cumsum(lengths)[:-1])
+
     @staticmethod
     def _t(lists):
         """
@@ -279,6 +379,15 @@ class NgramVectorizer(object):
 
         return np.transpose(filler)
 
+    def _lookup(self, ngrams, order):
+        lexicon = self.lexicons[order - 1]
+        if not isinstance(lexicon, dict):
+            return lexicon.lookup(ngrams)
+
+        return np.array([
+            self._find(ngram, order) for ngram in ngrams
+        ], dtype=np.int64)
+
     def _find(self, ngram, order):
         lexicon = self.lexicons[order - 1]
         return lexicon.get(ngram,
@@ -288,3 +397,210 @@ class NgramVectorizer(object):
         order -= 1
         inverse = self.inverted[order]
         return inverse.get(index, '?')
+
+
+# vectorizer used by the processes of a pool (see `_in_pool`):
+_vectorizer = None
+
+
+def _init_worker(vectorizer):
+    global _vectorizer
+    _vectorizer = vectorizer
+
+
+def _fit_shard(strings):
+    """
+    Collects the n-grams of each order in a
+    shard, in order of first occurrence.
+
+    :param strings:
+    :return:
+    """
+    max_order = _vectorizer.ngramorder + 1
+
+    n_grams_by_order = [{} for _ in range(1, max_order)]
+    for string in strings:
+        for order in range(1, max_order):
+            n_grams_by_order[order - 1].update(
+                dict.fromkeys(_vectorizer.n_grams(string, order))
+            )
+
+    return [list(n_grams) for n_grams in n_grams_by_order]
+
+
+def _invert_shard(strings):
+    """
+    Maps each bucket of a shard to the first
+    n-gram hashed to it, for each order.
+
+    :param strings:
+    :return:
+    """
+    inverted = [{} for _ in _vectorizer.lexicons]
+    _vectorizer._record(strings, inverted)
+
+    return inverted
+
+
+def _transform_shard(strings, max_order):
+    return _vectorizer.transform(strings, max_order=max_order)
+
+
+def _in_pool(function, strings, jobs, vectorizer):
+    """
+    Splits strings in contiguous shards and maps
+    `function` over them with a pool of `jobs` p-
+    rocesses; the vectorizer is shipped once per
+    process. Results are yielded in shard order.
+
+    :param function:
+    :param strings:
+    :param jobs:
+    :param vectorizer:
+    :return:
+    """
+    strings = list(strings)
+    size = max(1, -(-len(strings) // (4 * jobs)))
+    shards = [
+        strings[at: at + size] for
+        at in range(0, len(strings), size)
+    ]
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(vectorizer,)
+    ) as pool:
+        for result in pool.map(function, shards):
+            yield result
+
+
+class HashingVectorizer(NgramVectorizer):
+
+    # caps the default number of buckets:
+    MAX_BUCKETS = 2 ** 18
+
+    def __init__(self, order, bound=False, buckets=None):
+        """
+        Builds a vectorizer that, like `NgramVectorizer`,
+        transforms text to bag-of-ngrams up to `order`
+        ngrams, but maps n-grams to a fixed number of
+        buckets with the hashing trick (see `HashedLe-
+        xicon`). Needs no `fit` (that only records
+        what translating vectors back takes), its me-
+        mory is bounded by the buckets and its `tra-
+        nsform` is stateless, so it can be shipped to
+        as many processes as needed.
+
+        `buckets` can be an int (same number of buck-
+        ets for each order) or a list with one number
+        per order; by default, each order gets twice
+        as many buckets as its possible n-grams, but
+        no more than `MAX_BUCKETS`.
+
+        :param order:
+        :param bound:
+        :param buckets:
+        """
+        super(HashingVectorizer, self).__init__(
+                              order, bound=bound)
+
+        if buckets is None:
+            buckets = [
+                min(2 * CompactLexicon.BASE ** (i + 1), self.MAX_BUCKETS)
+                for i in range(self.ngramorder)
+            ]
+        if isinstance(buckets, int):
+            buckets = [buckets] * self.ngramorder
+
+        if len(buckets) != self.ngramorder:
+            raise ValueError(
+                f'Got {len(buckets)} bucket sizes for '
+                f'{self.ngramorder} orders - must match.'
+            )
+
+        self.lexicons = [
+            HashedLexicon(i + 1, n) for i, n in enumerate(buckets)
+        ]
+        self.invert()
+
+    def fit(self, strings, jobs=1):
+        """
+        Hashed lexicons need no fitting: this only
+        records, for each bucket, the first n-gram
+        hashed to it, so that vectors can be tran-
+        slated back (see `translate`). The reverse
+        maps hold at most one n-gram per bucket.
+
+        N-grams are streamed, a chunk of strings at
+        a time, and buckets that already have an n-
+        gram are left as they are, so memory does not
+        grow with the vocabulary. If `jobs` > 1, sh-
+        ards are mapped by a pool of `jobs` process-
+        es, each returning at most one n-gram per bu-
+        cket; shards are merged in order, so buckets
+        get the same n-grams of a serial fit.
+
+        :param strings:
+        :param jobs:
+        :return:
+        """
+        if jobs > 1:
+            shards = _in_pool(
+                _invert_shard, strings, jobs,
+                HashingVectorizer(
+                    self.ngramorder,
+                    bound=self.word_bound,
+                    buckets=[len(lexicon) for lexicon in self.lexicons]
+                )
+            )
+            for inverted in tqdm(shards):
+                for inverse, shard in zip(self.inverted, inverted):
+                    for ix, ngram in shard.items():
+                        inverse.setdefault(ix, ngram)
+        else:
+            self._record(tqdm(strings), self.inverted)
+
+    def _record(self, strings, inverted, chunk=1024):
+        """
+        Adds the first n-gram hashed to each bucket
+        (that has none yet) to the reverse maps.
+
+        :param strings:
+        :param inverted:
+        :param chunk:
+        :return:
+        """
+        strings = iter(strings)
+        max_order = self.ngramorder + 1
+
+        for strings_ in iter(lambda: list(islice(strings, chunk)), []):
+            for order in range(1, max_order):
+                n_grams = list(dict.fromkeys(
+                    ngram for string in strings_
+                    for ngram in self.n_grams(string, order)
+                ))
+
+                inverse = inverted[order - 1]
+                ids = self.lexicons[order - 1].lookup(n_grams).tolist()
+                for ix, ngram in zip(ids, n_grams):
+                    if ix not in inverse:
+                        inverse[ix] = ngram
+
+    def invert(self):
+        """
+        Resets the reverse maps (bucket to n-gram)
+        to the PAD bucket alone: hashes can not be
+        inverted, so they are filled by `fit`, and
+        buckets no n-gram was seen in translate to
+        `?`.
+
+        :return:
+        """
+        self.inverted = [{0: self.PAD} for _ in self.lexicons]
+
+    def settings(self):
+        settings = super(HashingVectorizer, self).settings()
+        settings['buckets'] = [len(lexicon) for lexicon in self.lexicons]
+
+        return settings
@@ -0,0 +1,328 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+
+class FlatIndex(object):
+    """
+    Exact cosine similarity index: embeddings are
+    normalized once, and stored as a float32 matrix
+    that queries are scanned against in one product.
+    """
+
+    # whether similarities are exact:
+    EXACT = True
+
+    def __init__(self, vectors):
+        """
+        :param vectors: (n, d) embeddings to index.
+        """
+        self.codes = self.encode(torch.as_tensor(vectors).float())
+
+    def encode(self, vectors):
+        return F.normalize(vectors, dim=-1)
+
+    def query(self, queries):
+        """
+        Maps (q, d) queries to the space of the codes.
+
+        :param queries:
+        :return:
+        """
+        return self.encode(torch.as_tensor(queries).float())
+
+    def scores(self, queries):
+        """
+        Returns the (q, n) similarities between each
+        query and each indexed embedding.
+
+        :param queries:
+        :return:
+        """
+        return (self.query(queries) @ self.codes.T).float()
+
+    def search(self, queries, k):
+        """
+        Returns the similarities and the positions of
+        the `k` indexed embeddings most similar to each
+        query, best first.
+
+        :param queries:
+        :param k:
+        :return:
+        """
+        scores = self.scores(queries)
+        return scores.topk(min(k, len(self)), dim=-1)
+
+    @property
+    def nbytes(self):
+        return self.codes.numel() * self.codes.element_size()
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class ProjectedIndex(FlatIndex):
+    """
+    Approximate cosine similarity index: embeddings
+    (and queries) are projected to `dim` dimensions,
+    and stored in float16, which cuts both memory
+    and scan time by `d / dim` times or more.
+
+    The projection is either fitted by PCA on the
+    (normalized) embeddings, or random (Gaussian).
+    """
+
+    EXACT = False
+
+    METHODS = ('pca', 'random')
+
+    def __init__(self, vectors, dim=32, method='pca', seed=0):
+        """
+        :param vectors: (n, d) embeddings to index.
+        :param dim: dimension of the projection.
+        :param method: `pca` or `random`.
+        :param seed: seed of the random projection.
+        """
+        vectors = F.normalize(torch.as_tensor(vectors).float(), dim=-1)
+
+        if method not in self.METHODS:
+            raise ValueError(
+                f'Invalid projection {method} - must be'
+                f' one of: {", ".join(self.METHODS)}'
+            )
+        if not 0 < dim <= vectors.size(-1):
+            raise ValueError(
+                f'Invalid dimension {dim} - must be wit'
+                f'hin 1 and {vectors.size(-1)}'
+            )
+
+        if method == 'pca':
+            # uncentered, to preserve inner products:
+            _, _, v = torch.linalg.svd(vectors, full_matrices=False)
+            self.projection = v[:dim].T.contiguous()
+        else:
+            generator = torch.Generator().manual_seed(seed)
+            self.projection = torch.randn(
+                vectors.size(-1), dim, generator=generator
+            ) / dim ** .5
+
+        super(ProjectedIndex, self).__init__(vectors)
+
+    def encode(self, vectors):
+        vectors = F.normalize(vectors, dim=-1) @ self.projection
+        return F.normalize(vectors, dim=-1).half()
+
+
+class PQIndex(FlatIndex):
+    """
+    Product-quantized index: (normalized) embeddings
+    are split in `m` sub-vectors, each replaced by
+    the id of its nearest centroid among the `2 **
+    bits` ones fitted (by k-means) on its subspace;
+    an embedding takes `m` bytes (with 8 bits).
+
+    Queries are not quantized: their similarities
+    to the centroids are tabulated once, and summ-
+    ed up per embedding (asymmetric distance).
+    """
+
+    EXACT = False
+
+    # embeddings k-means is fitted on:
+    MAX_TRAIN = 2 ** 16
+
+    def __init__(self, vectors, m=16, bits=8, iters=20, seed=0):
+        """
+        :param vectors: (n, d) embeddings to index.
+        :param m: number of sub-vectors.
+        :param bits: bits per sub-vector code (<= 8).
+        :param iters: k-means iterations.
+        :param seed:
+        """
+        vectors = F.normalize(torch.as_tensor(vectors).float(), dim=-1)
+
+        if vectors.size(-1) % m:
+            raise ValueError(
+                f'Invalid number of sub-vectors {m} - must'
+                f' divide the dimension ({vectors.size(-1)})'
+            )
+        if not 0 < bits <= 8:
+            raise ValueError(
+                f'Invalid number of bits {bits} - must '
+                f'be within 1 and 8'
+            )
+
+        self.m = m
+        generator = torch.Generator().manual_seed(seed)
+
+        train = vectors[torch.randperm(
+            len(vectors), generator=generator)[:self.MAX_TRAIN]]
+
+        # (m, k, d / m) centroids:
+        self.centroids = torch.stack([
+            _kmeans(sub, min(2 ** bits, len(train)), iters, generator)
+            for sub in self._split(train)
+        ])
+
+        super(PQIndex, self).__init__(vectors)
+
+    def encode(self, vectors):
+        # (m, n) codes: each sub-vector's codes
+        # are contiguous, to be scanned at once.
+        vectors = F.normalize(vectors, dim=-1)
+        return torch.stack([
+            _assign(sub, centroids) for sub, centroids
+            in zip(self._split(vectors), self.centroids)
+        ]).to(torch.uint8)
+
+    def query(self, queries):
+        # (q, m, k) similarities of each query's
+        # sub-vectors to their subspace centroids:
+        queries = F.normalize(torch.as_tensor(queries).float(), dim=-1)
+        return torch.stack([
+            sub @ centroids.T for sub, centroids
+            in zip(self._split(queries), self.centroids)
+        ], dim=1)
+
+    def scores(self, queries):
+        tables = self.query(queries)
+
+        scores = torch.zeros(len(tables), len(self))
+        for sub, codes in enumerate(self.codes):
+            scores += tables[:, sub].index_select(-1, codes.int())
+
+        return scores
+
+    def _split(self, vectors):
+        return vectors.chunk(self.m, dim=-1)
+
+    def __len__(self):
+        return self.codes.size(-1)
+
+
+class BinaryIndex(FlatIndex):
+    """
+    Binary index: each (normalized) embedding is
+    replaced by the signs of its projections on
+    `bits` random hyperplanes, packed in `bits / 8`
+    bytes. The Hamming distance of two codes, co-
+    unted by popcount, estimates the angle between
+    the embeddings (as in SimHash), and so their
+    cosine similarity.
+    """
+
+    EXACT = False
+
+    def __init__(self, vectors, bits=256, seed=0):
+        """
+        :param vectors: (n, d) embeddings to index.
+        :param bits: code size, a multiple of 8.
+        :param seed:
+        """
+        vectors = torch.as_tensor(vectors).float()
+
+        if bits <= 0 or bits % 8:
+            raise ValueError(
+                f'Invalid number of bits {bits} - must'
+                f' be a positive multiple of 8'
+            )
+
+        self.bits = bits
+        generator = torch.Generator().manual_seed(seed)
+        self.planes = torch.randn(vectors.size(-1), bits, generator=generator)
+
+        super(BinaryIndex, self).__init__(vectors)
+
+    def encode(self, vectors):
+        signs = (vectors @ self.planes > 0).numpy()
+        return torch.from_numpy(np.packbits(signs, axis=-1))
+
+    def scores(self, queries):
+        queries = _words(self.query(queries).numpy())
+        codes = _words(self.codes.numpy())
+
+        distances = np.stack([
+            _popcount(np.bitwise_xor(codes, query)).sum(axis=-1, dtype=np.int32)
+            for query in queries
+        ])
+
+        return torch.cos(torch.from_numpy(distances) * (np.pi / self.bits))
+
+
+def recall(index, reference, queries, k=10):
+    """
+    Fraction of the top-`k` results of `reference`
+    (e.g. a `FlatIndex` over the same embeddings)
+    that `index` also returns, averaged over the
+    queries.
+
+    :param index:
+    :param reference:
+    :param queries:
+    :param k:
+    :return:
+    """
+    _, found = index.search(queries, k)
+    _, exact = reference.search(queries, k)
+
+    hits = (found.unsqueeze(-1) == exact.unsqueeze(-2)).any(dim=-1)
+
+    return hits.float().mean().item()
+
+
+def _kmeans(vectors, k, iters, generator):
+    """
+    Fits `k` centroids to the vectors (Lloyd's
+    algorithm); empty clusters keep their cent-
+    roid.
+
+    :param vectors:
+    :param k:
+    :param iters:
+    :param generator:
+    :return:
+    """
+    centroids = vectors[torch.randperm(
+        len(vectors), generator=generator)[:k]].clone()
+
+    for _ in range(iters):
+        assigned = _assign(vectors, centroids)
+
+        sums = torch.zeros_like(centroids).index_add_(0, assigned, vectors)
+        counts = torch.bincount(assigned, minlength=k).unsqueeze(-1)
+
+        centroids = torch.where(counts > 0, sums / counts.clamp(min=1), centroids)
+
+    return centroids
+
+
+def _assign(vectors, centroids, chunk=2 ** 16):
+    # nearest centroid (by euclidean distance) of
+    # each vector, a chunk of vectors at a time:
+    norms = (centroids ** 2).sum(dim=-1)
+    return torch.cat([
+        (norms - 2 * part @ centroids.T).argmin(dim=-1)
+        for part in vectors.split(chunk)
+    ])
+
+
+# NumPy >= 2 counts bits natively:
+_NATIVE_POPCOUNT = hasattr(np, 'bitwise_count')
+
+if _NATIVE_POPCOUNT:
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(codes):
+        return _POPCOUNTS[codes]
+
+
+def _words(codes):
+    # with a native popcount, codes are scan-
+    # ned 64 bits (rather than 8) at a time:
+    if _NATIVE_POPCOUNT and codes.shape[-1] % 8 == 0:
+        return np.ascontiguousarray(codes).view(np.uint64)
+
+    return codes
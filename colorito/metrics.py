@@ -0,0 +1,223 @@
+from contextlib import nullcontext
+from bisect import bisect_left
+
+import threading
+import time
+
+
+class Metrics(object):
+    """
+    Latency histograms and counters of the stages
+    of palette operations (e.g. the `clean` stage
+    of `search`), exported as a plain dict or in
+    the Prometheus text format.
+
+    Callbacks, if any, are called with the opera-
+    tion, the stage and its duration (in seconds)
+    every time a stage is timed.
+    """
+
+    # upper bounds (in seconds) of the buckets:
+    BUCKETS = (
+        .0001, .00025, .0005, .001, .0025, .005, .01,
+        .025, .05, .1, .25, .5, 1., 2.5, 5., 10.
+    )
+
+    def __init__(self, buckets=BUCKETS, callbacks=()):
+        """
+        :param buckets: upper bounds of the histo-
+                        gram buckets, in seconds.
+        :param callbacks: functions called with (op-
+                          eration, stage, seconds).
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.callbacks = list(callbacks)
+
+        self.lock = threading.Lock()
+        self.reset()
+
+    def stage(self, operation, stage):
+        """
+        Context manager timing a stage of an opera-
+        tion, e.g.:
+
+            with metrics.stage('search', 'clean'):
+                ...
+
+        :param operation:
+        :param stage:
+        :return:
+        """
+        return _Timer(self, operation, stage)
+
+    def observe(self, operation, stage, seconds):
+        """
+        Records the duration of a stage.
+
+        :param operation:
+        :param stage:
+        :param seconds:
+        :return:
+        """
+        with self.lock:
+            histogram = self.histograms.get((operation, stage))
+            if histogram is None:
+                histogram = self.histograms[(operation, stage)] = {
+                    'counts': [0] * (len(self.buckets) + 1),
+                    'sum': 0.,
+                    'count': 0
+                }
+
+            # first bucket whose bound is >= seconds:
+            histogram['counts'][bisect_left(self.buckets, seconds)] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+        for callback in self.callbacks:
+            callback(operation, stage, seconds)
+
+    def count(self, operation, name, value=1):
+        """
+        Increments a counter of an operation (e.g.
+        the number of results of `search`).
+
+        :param operation:
+        :param name:
+        :param value:
+        :return:
+        """
+        with self.lock:
+            key = (operation, name)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def as_dict(self):
+        """
+        Returns the histograms (cumulative counts,
+        by bucket upper bound, sum and count) and
+        the counters, by operation.
+
+        :return:
+        """
+        with self.lock:
+            stages, counters = {}, {}
+
+            for (operation, stage), histogram in self.histograms.items():
+                stages.setdefault(operation, {})[stage] = {
+                    'buckets': dict(zip(
+                        [*self.buckets, float('inf')],
+                        _cumulative(histogram['counts'])
+                    )),
+                    'sum': histogram['sum'],
+                    'count': histogram['count']
+                }
+
+            for (operation, name), value in self.counters.items():
+                counters.setdefault(operation, {})[name] = value
+
+        return {'stages': stages, 'counters': counters}
+
+    def to_prometheus(self, prefix='colorito'):
+        """
+        Returns the metrics in the Prometheus text
+        exposition format: one histogram (`<pref-
+        ix>_stage_seconds`) labelled by operation
+        and stage, and a counter (`<prefix>_<na-
+        me>_total`) per counter name, labelled by
+        operation.
+
+        :param prefix:
+        :return:
+        """
+        metrics = self.as_dict()
+
+        name = f'{prefix}_stage_seconds'
+        lines = [
+            f'# HELP {name} Time spent in each stage of an operation.',
+            f'# TYPE {name} histogram'
+        ]
+        for operation, stages in sorted(metrics['stages'].items()):
+            for stage, histogram in sorted(stages.items()):
+                labels = f'operation="{operation}",stage="{stage}"'
+
+                for bound, count in histogram['buckets'].items():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+
+                lines.append(f'{name}_sum{{{labels}}} {histogram["sum"]!r}')
+                lines.append(f'{name}_count{{{labels}}} {histogram["count"]}')
+
+        counters = {}
+        for operation, values in metrics['counters'].items():
+            for counter, value in values.items():
+                counters.setdefault(counter, {})[operation] = value
+
+        for counter, values in sorted(counters.items()):
+            name = f'{prefix}_{counter}_total'
+            lines.append(f'# TYPE {name} counter')
+            for operation, value in sorted(values.items()):
+                lines.append(f'{name}{{operation="{operation}"}} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class NullMetrics(object):
+    """
+    Metrics that record nothing, used when inst-
+    rumentation is disabled: timing a stage costs
+    one method call.
+    """
+
+    _NOOP = nullcontext()
+
+    def stage(self, operation, stage):
+        return self._NOOP
+
+    def observe(self, operation, stage, seconds):
+        pass
+
+    def count(self, operation, name, value=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def as_dict(self):
+        return {'stages': {}, 'counters': {}}
+
+    def to_prometheus(self, prefix='colorito'):
+        return ''
+
+
+class _Timer(object):
+
+    __slots__ = ('metrics', 'operation', 'stage', 'start')
+
+    def __init__(self, metrics, operation, stage):
+        self.metrics = metrics
+        self.operation = operation
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(
+            self.operation,
+            self.stage,
+            time.perf_counter() - self.start
+        )
+
+
+def _cumulative(counts):
+    total, cumulative = 0, []
+    for count in counts:
+        total += count
+        cumulative.append(total)
+
+    return cumulative
@@ -0,0 +1,310 @@
+from colorito.nnet.modules.encoders import Encoder
+from colorito.data.lexicon import CompactLexicon, HashedLexicon
+from colorito.utils.logs import setup_logger
+from colorito.exceptions import SaveError, LoadError
+
+from torch.overrides import TorchFunctionMode
+
+import torch.nn as nn
+import numpy as np
+import argparse
+import struct
+import torch
+import json
+import os
+
+
+# Single-file format of a ColorGenerator (a bundle):
+#
+#     MAGIC | version | header size | header | blobs
+#
+# The header is JSON: the class and init parameters
+# of each sub-module, its lexicons (if an encoder),
+# and where each of the raw tensors (`blobs`) is -
+# parameters and lexicon arrays alike. Blobs are
+# stored as is, each aligned to `ALIGN` bytes, so
+# that a bundle is loaded by mapping it in memory:
+# nothing is unpickled or copied, pages are read
+# when first used, and processes loading the same
+# bundle share them (copy-on-write).
+
+MAGIC = b'COLORITO'
+VERSION = 1
+ALIGN = 64
+
+EXTENSION = '.bundle'
+
+_PRELUDE = struct.Struct('<8sII')
+
+logger = setup_logger('color-generator:bundle')
+
+
+def save(modules, to):
+    """
+    Writes sub-modules (SmartModules, by name) to
+    a bundle file.
+
+    :param modules: e.g. {'encoder': .., 'decoder': ..}
+    :param to: path of the bundle.
+    :return:
+    """
+    header = {'modules': {}, 'blobs': {}}
+    blobs, end = [], 0
+
+    def add_blob(key, tensor):
+        nonlocal end
+        tensor = tensor.detach().cpu().contiguous()
+
+        offset = _aligned(end)
+        end = offset + tensor.numel() * tensor.element_size()
+
+        header['blobs'][key] = {
+            'dtype': str(tensor.dtype).split('.')[-1],
+            'shape': list(tensor.shape),
+            'offset': offset
+        }
+        blobs.append((offset, tensor))
+
+        return key
+
+    for name, module in modules.items():
+        params = module.init_params
+        spec = {'class': module.name()}
+
+        if isinstance(module, Encoder):
+            params = params[1:]
+            spec['lexicons'] = [
+                _lexicon_spec(lexicon, f'{name}/lexicons/{i}', add_blob)
+                for i, lexicon in enumerate(module.lexicons_)
+            ]
+        spec['params'] = list(params)
+
+        for key, tensor in module.state_dict().items():
+            add_blob(f'{name}/{key}', tensor)
+
+        header['modules'][name] = spec
+
+    try:
+        header = json.dumps(header).encode('utf-8')
+    except TypeError as ex:
+        raise SaveError(
+            cls='bundle',
+            err=f'init parameters must be '
+                f'JSON serializable ({ex})'
+        )
+
+    start = _aligned(_PRELUDE.size + len(header))
+
+    with open(to, 'wb') as f:
+        f.write(_PRELUDE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        f.write(b'\0' * (start - f.tell()))
+
+        for offset, tensor in blobs:
+            f.write(b'\0' * (start + offset - f.tell()))
+            f.write(tensor.reshape(-1).view(torch.uint8).numpy().data)
+
+
+def load(from_, registry):
+    """
+    Maps a bundle file in memory, and rebuilds its
+    sub-modules (by name) around the mapped tensors.
+
+    :param from_: path of the bundle.
+    :param registry: SmartModule classes, by name.
+    :return:
+    """
+    try:
+        header, start = _read_header(from_)
+        data = np.memmap(from_, dtype=np.uint8, mode='c', offset=start)
+    except (OSError, ValueError) as ex:
+        raise LoadError(
+            cls='bundle',
+            err=f'could not read {from_} ({ex})'
+        )
+
+    def blob(key):
+        spec = header['blobs'][key]
+        dtype = getattr(torch, spec['dtype'])
+
+        size = dtype.itemsize * int(np.prod(spec['shape'], dtype=np.int64))
+        data_ = data[spec['offset']: spec['offset'] + size]
+
+        return torch.from_numpy(data_).view(dtype).view(spec['shape'])
+
+    modules = {}
+    for name, spec in header['modules'].items():
+        if spec['class'] not in registry:
+            raise LoadError(
+                cls='bundle',
+                err=f'unknown module {spec["class"]}'
+                    f' (not in the registry)'
+            )
+
+        params = [_tuples(param) for param in spec['params']]
+        if 'lexicons' in spec:
+            params.insert(0, [
+                _lexicon(lexicon, blob) for lexicon in spec['lexicons']
+            ])
+
+        # weights are replaced by the mapped
+        # ones, do not initialize them first:
+        with _SkipInit():
+            module = registry[spec['class']](*params)
+
+        prefix = f'{name}/'
+        state = {
+            key[len(prefix):]: blob(key) for key in header['blobs']
+            if key.startswith(prefix) and '/lexicons/' not in key
+        }
+        try:
+            module.load_state_dict(state, assign=True)
+        except RuntimeError as ex:
+            raise LoadError(
+                cls=spec['class'],
+                err=f'invalid parameters in {from_} ({ex})'
+            )
+
+        modules[name] = module
+
+    return modules
+
+
+def is_bundle(path):
+    """
+    Whether `path` is a bundle file.
+
+    :param path:
+    :return:
+    """
+    if not os.path.isfile(path):
+        return False
+
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        magic, version, size = _PRELUDE.unpack(f.read(_PRELUDE.size))
+        if magic != MAGIC:
+            raise ValueError('not a bundle')
+        if version != VERSION:
+            raise ValueError(f'unsupported version {version}')
+
+        header = json.loads(f.read(size).decode('utf-8'))
+
+    return header, _aligned(_PRELUDE.size + size)
+
+
+def _lexicon_spec(lexicon, key, add_blob):
+    if isinstance(lexicon, HashedLexicon):
+        return {
+            'kind': 'hashed',
+            'order': lexicon.order,
+            'buckets': lexicon.buckets
+        }
+
+    if isinstance(lexicon, CompactLexicon):
+        return {
+            'kind': 'compact',
+            'order': lexicon.order,
+            'codes': add_blob(f'{key}/codes', torch.from_numpy(lexicon.codes)),
+            'ids': add_blob(f'{key}/ids', torch.from_numpy(lexicon.ids)),
+            'extra': {ngram: int(ix) for ngram, ix in lexicon.extra.items()}
+        }
+
+    raise SaveError(
+        cls='bundle',
+        err=f'can not store a lexicon of type'
+            f' {lexicon.__class__.__name__}'
+    )
+
+
+def _lexicon(spec, blob):
+    if spec['kind'] == 'hashed':
+        return HashedLexicon(spec['order'], spec['buckets'])
+
+    return CompactLexicon(
+        blob(spec['codes']).numpy(),
+        blob(spec['ids']).numpy(),
+        spec['order'],
+        extra=spec['extra']
+    )
+
+
+def _tuples(param):
+    # JSON turns the tuples (e.g. input dims)
+    # of the init parameters to lists:
+    if isinstance(param, list):
+        return tuple(_tuples(item) for item in param)
+
+    return param
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+class _SkipInit(TorchFunctionMode):
+    """
+    Skips the initialization of weights that are
+    about to be replaced, while modules are built:
+    the initializers of `torch.nn.init` and the in-
+    place random fills they rely on return their
+    tensor untouched. Function modes are thread-lo-
+    cal, so modules built by other threads at the
+    same time are initialized as usual.
+    """
+
+    _FILLS = {
+        torch.Tensor.uniform_,
+        torch.Tensor.normal_,
+        torch.Tensor.random_,
+        torch.Tensor.bernoulli_,
+        torch.Tensor.exponential_,
+        torch.Tensor.log_normal_,
+        torch.Tensor.cauchy_,
+        torch.Tensor.geometric_
+    }
+
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        kwargs = kwargs or {}
+
+        if func in self._FILLS or getattr(func, '__module__', None) == nn.init.__name__:
+            return args[0] if args else kwargs['tensor']
+
+        return func(*args, **kwargs)
+
+
+def argument_parser():
+
+    parser = argparse.ArgumentParser(
+        description='Colorito command line: conv'
+                    'ert a saved ColorGenerator '
+                    'to a single-file bundle!'
+    )
+    parser.add_argument(
+        'model',
+        help='Path to the folder of a saved C'
+             'olorGenerator'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        default=None,
+        help=f'Path of the bundle (defaults to'
+             f' the model\'s, with {EXTENSION})'
+    )
+
+    return parser
+
+
+if __name__ == '__main__':
+    from colorito.nnet.model import ColorGenerator
+
+    args = argument_parser().parse_args()
+    output = args.output or args.model.rstrip(os.sep) + EXTENSION
+
+    ColorGenerator.load(args.model).save(output, bundle=True)
+    logger.info(f' saved {args.model} to {output}')
@@ -0,0 +1,439 @@
+from colorito import COLORS, DEVICE, MODELS, DEFAULT_NETWORK
+
+from colorito.utils.logs import setup_logger
+
+from colorito.data.vectorize import NgramVectorizer
+from colorito.data.dataset import ColorDataset
+from colorito.data.sampler import BucketBatchSampler
+from colorito.data.utils import encode
+
+from colorito.nnet.model import ColorGenerator
+from colorito.nnet.modules.encoders.lstm import StudentEncoder
+from colorito.nnet.latency import latency, sample_names
+from colorito.nnet.train import defaults as train_defaults, _configure_threads, _lengths
+
+from torch.utils.data.dataloader import DataLoader
+from torch.utils.data import random_split
+from datetime import datetime
+from tqdm.autonotebook import tqdm
+
+import torch
+import torch.nn as nn
+import numpy as np
+import argparse
+import json
+import os
+
+
+defaults = {
+    'teacher': DEFAULT_NETWORK,
+    'data': COLORS,
+    'output': MODELS,
+    'epochs': train_defaults['epochs'],
+    'batch_size': train_defaults['batch_size'],
+    'learning_rate': train_defaults['learning_rate'],
+    'alpha': 1.0,
+    'truth': 0.0,
+    'validation': 0.1,
+    'threads': 0,
+    'palette': 1000,
+    'queries': 200,
+    'k': 10
+}
+
+logger = setup_logger('color-generator:distill')
+
+
+def distill(
+    teacher=defaults['teacher'],
+    data=defaults['data'],
+    output=defaults['output'],
+    epochs=defaults['epochs'],
+    batch_size=defaults['batch_size'],
+    learning_rate=defaults['learning_rate'],
+    alpha=defaults['alpha'],
+    truth=defaults['truth'],
+    validation=defaults['validation'],
+    bucket=False,
+    cache=None,
+    threads=defaults['threads'],
+    palette=defaults['palette'],
+    queries=defaults['queries'],
+    k=defaults['k']
+):
+    """
+    Distills a trained ColorGenerator (the teacher)
+    into a smaller one (the student, with a `Stud-
+    entEncoder`): the student learns to match both
+    the colors the teacher generates and its hidden
+    representation `h`, that palettes search by.
+
+    The student shares the teacher's lexicons, and
+    is saved in the same format, so it can replace
+    the teacher as is. A report comparing search
+    rankings and latency of the two is logged, and
+    saved next to the student.
+
+    :param teacher: path to the teacher.
+    :param data:
+    :param output:
+    :param epochs:
+    :param batch_size:
+    :param learning_rate:
+    :param alpha: weight of the loss on `h`.
+    :param truth: weight of the loss on the true
+                  colors (0: teacher's colors only).
+    :param validation: fraction of the data held out
+                       to compute a validation loss.
+    :param bucket: batch together names of similar
+                   length (see `BucketBatchSampler`).
+    :param cache: directory where the preprocessed
+                  dataset is cached between runs.
+    :param threads: number of intra-op threads.
+    :param palette: names searched by the report.
+    :param queries: names searched for by the report.
+    :param k: results compared per search.
+    :return: path of the student, and the report.
+    """
+
+    _configure_threads(threads, 0)
+
+    if not os.path.isdir(output):
+        raise ValueError(
+            f' Invalid output path: {output} is not a directory.'
+        )
+
+    logger.info(f' loading the teacher from {teacher}...')
+
+    teacher = ColorGenerator.load(teacher)
+    teacher.eval()
+
+    # names are vectorized with the teacher's
+    # lexicons, which the student shares:
+    lexicons = teacher.encoder.lexicons_
+    vectorz = NgramVectorizer(order=len(lexicons))
+    vectorz.lexicons = lexicons
+    vectorz.invert()
+
+    dataset = ColorDataset.build(
+        data,
+        vectorizer=vectorz,
+        space='lab',
+        cache=cache,
+        fit=False
+    )
+
+    student = ColorGenerator(StudentEncoder(
+        input_dim=tuple(dataset.x[0].size()),
+        lexicons_=lexicons,
+        max_ngram_order=len(lexicons),
+        ret_sequences=False
+    ))
+
+    valid_loader = None
+    if validation:
+        n_valid = int(len(dataset) * validation)
+        dataset, valid_set = random_split(
+            dataset,
+            [len(dataset) - n_valid, n_valid],
+            generator=torch.Generator().manual_seed(0)
+        )
+        valid_loader = DataLoader(
+            valid_set, batch_size,
+            collate_fn=ColorDataset.collate
+        )
+
+    if bucket:
+        dataloader = DataLoader(
+            dataset,
+            batch_sampler=BucketBatchSampler(
+                _lengths(dataset), batch_size),
+            collate_fn=ColorDataset.collate
+        )
+    else:
+        dataloader = DataLoader(
+            dataset, batch_size,
+            shuffle=True,
+            collate_fn=ColorDataset.collate
+        )
+
+    criterion_ = nn.MSELoss()
+    optimizer = torch.optim.Adam(
+        student.parameters(),
+        lr=learning_rate
+    )
+
+    def distillation_loss(X, y):
+        with torch.no_grad():
+            y_teacher, h_teacher = _forward(teacher, X)
+
+        y_student, h_student = _forward(student, X)
+
+        loss = (
+            criterion_(y_student, y_teacher) +
+            alpha * criterion_(h_student, h_teacher)
+        )
+        if truth:
+            loss = loss + truth * criterion_(y_student, y)
+
+        return loss
+
+    logger.info(
+        f' will distill for {epochs} epochs; with {batch_size}-'
+        f'sized mini-batches and with a learning rate of '
+        f'{learning_rate}'
+    )
+
+    for epoch in range(epochs):
+
+        if hasattr(dataloader.batch_sampler, 'set_epoch'):
+            dataloader.batch_sampler.set_epoch(epoch)
+
+        logger.info(f' Epoch {epoch + 1}/{epochs}')
+
+        avg_epoch_loss = []
+        pbar = tqdm(total=len(dataloader))
+
+        for X, y in dataloader:
+            X.to(DEVICE)
+
+            optimizer.zero_grad()
+
+            loss = distillation_loss(X, y)
+            loss.backward()
+
+            optimizer.step()
+
+            pbar.set_description(f' loss: {loss.item()}')
+            avg_epoch_loss.append(loss.item())
+
+            pbar.update(1)
+
+        pbar.close()
+
+        logger.info(f' Average Loss: {np.mean(avg_epoch_loss)}')
+
+        if valid_loader is not None:
+            student.eval()
+
+            total, samples = 0., 0
+            with torch.no_grad():
+                for X, y in valid_loader:
+                    total += distillation_loss(X, y).item() * len(y)
+                    samples += len(y)
+
+            student.train(mode=True)
+
+            logger.info(f' Validation Loss: {total / samples}')
+
+    # save the student!
+
+    output = os.path.join(output, 'color-generator-student')
+    if os.path.isdir(output):
+        # append timestamp to avoid clashes
+        output += f' ({datetime.utcnow()})'
+
+    logger.info(f' will save the student to: {output}...')
+
+    os.mkdir(output)
+    student.save(output)
+
+    names = sample_names(data, palette + queries)
+    report_ = report(
+        teacher,
+        student,
+        palette=names[:palette],
+        queries=names[palette:],
+        k=k
+    )
+
+    with open(output + '.report.json', 'w') as f:
+        json.dump(report_, f, indent=2)
+
+    return output, report_
+
+
+def report(teacher, student, palette, queries, k=10):
+    """
+    Compares the student with its teacher: for
+    each query, the palette is ranked by cosine
+    similarity of `h` (as in `SmartPalette.sea-
+    rch`) with both models, and the top-`k` re-
+    sults are compared. Latency is the median
+    time to embed a single name.
+
+    :param teacher:
+    :param student:
+    :param palette: names of the palette colors.
+    :param queries: names searched for.
+    :param k:
+    :return:
+    """
+    vectorz = NgramVectorizer(order=len(teacher.encoder.lexicons_))
+    vectorz.lexicons = teacher.encoder.lexicons_
+
+    k = min(k, len(palette))
+    x_palette, x_queries = encode(palette, vectorz), encode(queries, vectorz)
+
+    def top_k(cg):
+        h = nn.functional.normalize(cg.h(x_palette), dim=-1)
+        q = nn.functional.normalize(cg.h(x_queries), dim=-1)
+
+        return (q @ h.T).topk(k, dim=-1).indices
+
+    teacher_top, student_top = top_k(teacher), top_k(student)
+
+    overlap = [
+        len(set(t.tolist()) & set(s.tolist())) / k
+        for t, s in zip(teacher_top, student_top)
+    ]
+
+    report_ = {
+        'k': k,
+        'top1_agreement': (teacher_top[:, 0] == student_top[:, 0])
+                          .float().mean().item(),
+        f'overlap_at_{k}': float(np.mean(overlap)),
+        'teacher_latency_ms': latency(teacher, queries),
+        'student_latency_ms': latency(student, queries),
+        'teacher_parameters': sum(p.numel() for p in teacher.parameters()),
+        'student_parameters': sum(p.numel() for p in student.parameters())
+    }
+
+    logger.info(' distillation report:')
+    for metric, value in report_.items():
+        logger.info(f'   {metric}: {value}')
+
+    return report_
+
+
+def _forward(cg, x):
+    """
+    Returns both the colors the model generates
+    and its hidden representation `h`.
+
+    :param cg:
+    :param x:
+    :return:
+    """
+    x, _ = cg.encoder(x)
+    return cg.decoder(x)
+
+
+def argument_parser():
+
+    parser = argparse.ArgumentParser(
+        description='Colorito command line: dist'
+                    'ill a ColorGenerator into a '
+                    'faster one!'
+    )
+    parser.add_argument(
+        '-t',
+        '--teacher',
+        default=defaults['teacher'],
+        help='Path to the ColorGenerator to di'
+             'still (the teacher)'
+    )
+    parser.add_argument(
+        '-d',
+        '--data',
+        default=defaults['data'],
+        help='Path to the folder containing '
+             'the csv with colors'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        default=defaults['output'],
+        help='Path to where the student is saved'
+    )
+    parser.add_argument(
+        '--alpha',
+        default=defaults['alpha'],
+        type=float,
+        help='Weight of the loss on the hidden'
+             ' representation'
+    )
+    parser.add_argument(
+        '--truth',
+        default=defaults['truth'],
+        type=float,
+        help='Weight of the loss on the true c'
+             'olors'
+    )
+    parser.add_argument(
+        '--validation',
+        default=defaults['validation'],
+        type=float,
+        help='Fraction of the data held out to'
+             ' compute a validation loss'
+    )
+    parser.add_argument(
+        '--bucket',
+        action='store_true',
+        help='Batch together names of similar '
+             'length, to cut down on padding'
+    )
+    parser.add_argument(
+        '--cache',
+        default=None,
+        help='Path to a folder where to cache '
+             'the preprocessed training data'
+    )
+    parser.add_argument(
+        '--threads',
+        default=defaults['threads'],
+        type=int,
+        help='Number of intra-op threads (0 f'
+             'or torch\'s default)'
+    )
+    parser.add_argument(
+        '--palette',
+        default=defaults['palette'],
+        type=int,
+        help='Number of names in the palette '
+             'searched by the report'
+    )
+    parser.add_argument(
+        '--queries',
+        default=defaults['queries'],
+        type=int,
+        help='Number of names searched for by '
+             'the report'
+    )
+    parser.add_argument(
+        '-k',
+        default=defaults['k'],
+        type=int,
+        help='Number of results compared per '
+             'search'
+    )
+    parser.add_argument(
+        '-e',
+        '--epochs',
+        default=defaults['epochs'],
+        type=int,
+        help='Number of training epochs'
+    )
+    parser.add_argument(
+        '-b',
+        '--batch_size',
+        default=defaults['batch_size'],
+        type=int,
+        help='Size of a training batch'
+    )
+    parser.add_argument(
+        '-lr',
+        '--learning_rate',
+        default=defaults['learning_rate'],
+        type=float,
+        help='Learning rate for optimizing'
+    )
+
+    return parser
+
+
+if __name__ == '__main__':
+
+    args = argument_parser().parse_args()
+
+    distill(**vars(args))
@@ -0,0 +1,56 @@
+from colorito.utils import Reader
+from colorito.data.vectorize import NgramVectorizer
+from colorito.data.utils import encode
+
+import statistics
+import random
+import torch
+import time
+import os
+
+
+def latency(cg, names, threads=1):
+    """
+    Median time (in milliseconds) a ColorGenerator
+    takes to embed a single color name (vectoriz-
+    ation included), as a palette search does.
+
+    :param cg:
+    :param names:
+    :param threads: intra-op threads used meanwhile.
+    :return:
+    """
+    vectorz = NgramVectorizer(order=len(cg.encoder.lexicons_))
+    vectorz.lexicons = cg.encoder.lexicons_
+
+    threads_ = torch.get_num_threads()
+    torch.set_num_threads(threads)
+
+    timings = []
+    for name in names:
+        tick = time.perf_counter()
+        cg.h(encode(name, vectorz))
+        timings.append(time.perf_counter() - tick)
+
+    torch.set_num_threads(threads_)
+
+    return statistics.median(timings) * 1000
+
+
+def sample_names(data, n, seed=0):
+    """
+    Picks `n` color names at random from the csv
+    files in `data` (e.g. to measure latency).
+
+    :param data:
+    :param n:
+    :param seed:
+    :return:
+    """
+    names = []
+    for fi in sorted(os.listdir(data)):
+        if fi.endswith('.csv'):
+            # skip the header:
+            names += list(Reader.read(os.path.join(data, fi)))[1:]
+
+    return random.Random(seed).sample(names, min(n, len(names)))
@@ -1,6 +1,8 @@
 from colorito.nnet.modules import SmartModule
-from colorito.nnet.modules.encoders.lstm import LSTMEncoder, LiteEncoder
+from colorito.nnet.modules.encoders.lstm import LSTMEncoder, LiteEncoder, StudentEncoder
+from colorito.nnet.modules.encoders.bag import BagEncoder
 from colorito.nnet.modules.decoder import Decoder
+from colorito.nnet import bundle as bundle_
 from colorito.utils.fs import mkdir
 from colorito.utils.logs import setup_logger
 from colorito.exceptions import SaveError, LoadError
@@ -23,10 +25,18 @@ class ColorGenerator(nn.Module):
     REGISTRY = {
         'encoder': {
             LSTMEncoder.name(): LSTMEncoder,
-            LiteEncoder.name(): LiteEncoder
+            LiteEncoder.name(): LiteEncoder,
+            StudentEncoder.name(): StudentEncoder,
+            BagEncoder.name(): BagEncoder
         }
     }
 
+    # max number of sequences per bucket
+    # when running inference (see `in_b-
+    # uckets`):
+
+    BUCKET_SIZE = 256
+
     def __init__(self, encoder, decoder=None):
         assert isinstance(encoder, SmartModule), f'{encoder.__class__.__name__} is not a SmartModule'
         assert (
@@ -55,31 +65,81 @@ class ColorGenerator(nn.Module):
         return x
 
     def h(self, x):
+        # inference runs in eval mode, the mo-
+        # de the model was in is then restored:
+        training = self.training
         self.eval()
         with torch.no_grad():
-            x, _ = self.encoder(x)
-            _, h = self.decoder(x)
+            h = self.in_buckets(self._h, x)
 
-        self.train(mode=True)
+        self.train(mode=training)
 
         return h
 
     def y(self, x):
+        training = self.training
         self.eval()
-        y = self(x)
+        y = self.in_buckets(self, x)
 
-        self.train(mode=True)
+        self.train(mode=training)
 
         return y
 
-    def save(self, to):
+    def _h(self, x):
+        x, _ = self.encoder(x)
+        _, h = self.decoder(x)
+        return h
+
+    def in_buckets(self, function, x):
+        """
+        Applies `function` to a batch, by splitting
+        it into buckets of `BUCKET_SIZE` sequences of
+        similar length, each trimmed of the padding
+        that all its sequences share. Outputs are r-
+        eturned in the original order of the batch.
+
+        Only meant for inference, where sequences do
+        not influence each other's output.
+
+        :param function:
+        :param x:
+        :return:
+        """
+        if len(x) <= self.BUCKET_SIZE:
+            return function(x)
+
+        # padding comes last, and has all-
+        # zero features for each element:
+        lengths = (x != 0).any(dim=-1).sum(dim=-1)
+        sorted_ix = lengths.argsort(descending=True)
+
+        outputs = [
+            function(x[ix, :max(1, lengths[ix[0]].item())])
+            for ix in sorted_ix.split(self.BUCKET_SIZE)
+        ]
+        outputs = torch.cat(outputs)
+
+        unsorted = torch.empty_like(outputs)
+        unsorted[sorted_ix] = outputs
+
+        return unsorted
+
+    def save(self, to, bundle=False):
         """
         Saves the ColorGenerator to file-system.
 
         :param to:
+        :param bundle: if True, `to` is the path of a
+                       single-file bundle to write (see
+                       `colorito.nnet.bundle`), rather
+                       than a directory.
         :return:
         """
         module = self.__class__.__name__
+        if bundle:
+            return bundle_.save(
+                {'encoder': self.encoder, 'decoder': self.decoder}, to)
+
         if not os.path.isdir(to):
             raise SaveError(
                 cls=module ,
@@ -99,7 +159,8 @@ class ColorGenerator(nn.Module):
 
         metadata_f = os.path.join(to, self.metadata_fname())
         try:
-            pickle.dump( metadata,  open(metadata_f, 'wb') )
+            with open(metadata_f, 'wb') as f:
+                pickle.dump(metadata, f)
         except Exception as ex:
             raise SaveError(
                 cls=module ,
@@ -121,12 +182,21 @@ class ColorGenerator(nn.Module):
     @classmethod
     def load(cls, from_):
         """
-        Loads a ColorGenerator from file-system.
+        Loads a ColorGenerator from file-system: from
+        the directory it was saved to, or from a bun-
+        dle file (see `colorito.nnet.bundle`).
 
         :param from_:
         :return:
         """
         module = cls.__name__
+        if bundle_.is_bundle(from_):
+            modules = bundle_.load(from_, {
+                **cls.REGISTRY['encoder'],
+                Decoder.name(): Decoder
+            })
+            return cls(modules['encoder'], decoder=modules['decoder'])
+
         if not os.path.isdir(from_):
             raise LoadError(
                 cls=module ,
@@ -139,7 +209,8 @@ class ColorGenerator(nn.Module):
 
         metadata_f = os.path.join(from_, cls.metadata_fname())
         try:
-            metadata = pickle.load( open( metadata_f, 'rb' ) )
+            with open(metadata_f, 'rb') as f:
+                metadata = pickle.load(f)
         except Exception as ex:
             raise LoadError(
                 cls=module ,
@@ -40,10 +40,8 @@ class SmartModule(nn.Module):
         )
         # save metadata:
         try:
-            pickle.dump(
-                self.init_params,
-                open(metadata_f, 'wb')
-            )
+            with open(metadata_f, 'wb') as f:
+                pickle.dump(self.init_params, f)
         except Exception as ex:
             raise SaveError(
                 cls=self.name(),
@@ -79,9 +77,8 @@ class SmartModule(nn.Module):
         )
         # load metadata:
         try:
-            metadata = pickle.load(
-             open(metadata_f, 'rb')
-            )
+            with open(metadata_f, 'rb') as f:
+                metadata = pickle.load(f)
         except Exception as ex:
             raise LoadError(
                 cls=cls.name(),
@@ -0,0 +1,112 @@
+from math import gcd
+from functools import reduce
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+class NgramEmbedding(nn.Module):
+
+    def __init__(self, sizes, dims, paddings):
+        """
+        Embeds n-grams of several orders with one
+        lookup: embeddings of all the orders are
+        stored in a single table, with rows as wi-
+        de as the greatest common divisor of the
+        embedding sizes (the `unit`). The embedd-
+        ing of an n-gram spans `dims[i] / unit`
+        consecutive rows of its order's block, so
+        that gathering the rows of all the n-grams
+        of an element returns their concatenated
+        embeddings, with no further copy.
+
+        Row zero is an all-zero row shared by the
+        padding indexes of all orders, whose grad-
+        ient is always zero.
+
+        :param sizes: number of n-grams per order.
+        :param dims: embedding size per order.
+        :param paddings: padding index per order.
+        """
+        super(NgramEmbedding, self).__init__()
+
+        self.sizes = list(sizes)
+        self.dims = list(dims)
+        self.unit = reduce(gcd, self.dims)
+
+        spans = [dim // self.unit for dim in self.dims]
+
+        offsets = [1]
+        for size, span in zip(self.sizes[:-1], spans[:-1]):
+            offsets.append(offsets[-1] + size * span)
+
+        weight = torch.zeros(
+            1 + sum(size * span for size, span in zip(self.sizes, spans)),
+            self.unit
+        )
+        for offset, size, dim, pad in zip(
+            offsets, self.sizes, self.dims, paddings
+        ):
+            embeddings = torch.empty(size, dim)
+            nn.init.normal_(embeddings)
+            embeddings[pad].zero_()
+
+            weight[offset: offset + size * dim // self.unit] = embeddings.view(
+                                                            -1, self.unit)
+
+        self.weight = nn.Parameter(weight)
+        self.offsets = offsets
+
+        # for each row to gather per element:
+        # which order (column of the input) it
+        # comes from, how many rows per n-gram
+        # that order has, where the row is wrt
+        # the n-gram's first row, and the pad-
+        # ding index of its order.
+        orders, steps = [], []
+        for order, span in enumerate(spans):
+            orders += [order] * span
+            steps += [offsets[order] + step for step in range(span)]
+
+        self.register_buffer('orders', torch.tensor(orders), persistent=False)
+        self.register_buffer('steps', torch.tensor(steps), persistent=False)
+        self.register_buffer('spans', torch.tensor(spans)[orders], persistent=False)
+        self.register_buffer('paddings', torch.tensor(paddings)[orders], persistent=False)
+
+    @property
+    def embedding_dim(self):
+        return sum(self.dims)
+
+    def forward(self, x):
+        """
+        Maps a (..., orders) tensor of n-gram indexes
+        to the (..., sum(dims)) concatenation of their
+        embeddings.
+
+        :param x:
+        :return:
+        """
+        x = x.long().index_select(-1, self.orders)
+        ix = (x * self.spans + self.steps).masked_fill(
+                                x == self.paddings, 0)
+
+        x = F.embedding(ix, self.weight, padding_idx=0)
+
+        return x.flatten(-2)
+
+    def pack(self, weights):
+        """
+        Builds a table out of per-order embedding
+        matrices (e.g. the weights of `nn.Embedd-
+        ing` layers, one per order).
+
+        :param weights:
+        :return:
+        """
+        table = torch.zeros_like(self.weight)
+        for offset, weight in zip(self.offsets, weights):
+            weight = weight.reshape(-1, self.unit)
+            table[offset: offset + len(weight)] = weight
+
+        return table
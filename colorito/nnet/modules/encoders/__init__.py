@@ -1,4 +1,5 @@
 from colorito.nnet.modules import SmartModule
+from colorito.data.lexicon import CompactLexicon
 from colorito import DEVICE
 
 import torch
@@ -7,6 +8,11 @@ import torch
 class Encoder(SmartModule):
 
     def __init__(self, lexicons, *args):
+        # lexicons are persisted with the
+        # module's metadata, keep them co-
+        # mpact (see `CompactLexicon`):
+        lexicons = CompactLexicon.compact(lexicons)
+
         self.lexicons_ = lexicons
         super(Encoder, self).__init__(
                       lexicons, *args)
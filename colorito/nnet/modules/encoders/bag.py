@@ -0,0 +1,88 @@
+from colorito import DEVICE
+from colorito.nnet.modules.encoders import Encoder
+
+import torch
+import torch.nn as nn
+
+
+class BagEncoder(Encoder):
+
+    def __init__(
+        self,
+        lexicons_,
+        input_dim,
+        max_ngram_order=1
+    ):
+        """
+        Non-recurrent encoder: names are embedded as
+        bags of their n-grams (the mean of their emb-
+        eddings, one bag per order), then fed to a
+        feed-forward network. All the elements of a
+        name are embedded at once, so latency does
+        not grow with its length.
+
+        :param lexicons_:
+        :param input_dim:
+        :param max_ngram_order:
+        """
+        super(BagEncoder, self).__init__(
+            lexicons_,
+            input_dim,
+            max_ngram_order
+        )
+
+        self.input_dim = input_dim
+        self.max_ngram_order = max_ngram_order
+
+        # only n-grams up to `max_ngram_order`
+        # are embedded (as in `LSTMEncoder`):
+        sizes = [len(self.lexicons_[order]) for order in range(max_ngram_order)]
+
+        # the n-grams of all orders share one
+        # table, each order in its own block;
+        # row zero is for padding, that bags
+        # leave out:
+        offsets = [1]
+        for size in sizes[:-1]:
+            offsets.append(offsets[-1] + size)
+
+        self.bags = nn.EmbeddingBag(
+            num_embeddings=1 + sum(sizes),
+            embedding_dim=self.embedding_dim,
+            mode='mean',
+            padding_idx=0
+        ).to(DEVICE)
+
+        self.register_buffer('offsets', torch.tensor(offsets), persistent=False)
+        self.register_buffer('paddings', torch.tensor([
+            self.lexicons_[order]['#'] for order in range(max_ngram_order)
+        ]), persistent=False)
+
+        self.mlp = nn.Sequential(
+            nn.Linear(self.embedding_dim * len(sizes), self.hidden_dim),
+            nn.ReLU(),
+            nn.Linear(self.hidden_dim, self.hidden_dim),
+            nn.ReLU()
+        ).to(DEVICE)
+
+    @property
+    def embedding_dim(self):
+        return 64
+
+    @property
+    def hidden_dim(self):
+        return 256
+
+    def forward(self, x):
+        batch_size = x.size()[0]
+
+        x = x[:, :, :self.max_ngram_order].long()
+        x = (x + self.offsets).masked_fill(x == self.paddings, 0)
+
+        # one bag per name and order:
+        x = x.transpose(1, 2).reshape(-1, x.size(1))
+        x = self.bags(x).view(batch_size, -1)
+
+        x = self.mlp(x)
+
+        return x, None
@@ -1,5 +1,6 @@
 from colorito import DEVICE
 from colorito.nnet.modules.encoders import Encoder
+from colorito.nnet.modules.embedding import NgramEmbedding
 
 from torch.nn.utils.rnn import pad_packed_sequence, pack_padded_sequence
 
@@ -24,7 +25,6 @@ class LSTMEncoder(Encoder):
         )
 
         self.input_dim = input_dim
-        self.lexicons_ = lexicons_
         self.ret_sequences = ret_sequences
 
         # will cat 1-gram, 2-gram, ..., n-gram
@@ -46,8 +46,6 @@ class LSTMEncoder(Encoder):
             hidden_size=self.hidden_dim
         )
 
-        self.h, self.c = None, None
-
     @property
     def hidden_dim(self):
         return 512
@@ -56,52 +54,69 @@ class LSTMEncoder(Encoder):
     def num_layers(self):
         return 2
 
+    def embedding_dims(self, max_order):
+        # increase the embedding dimension as
+        # the ngram order increases:
+        return [int(32 * (order+1)) for order in range(max_order)]
+
     def _init_embedd(self, max_order):
         """
-        Builds the embedding layers. One layer
-        per ngram feature (up to `max_order`).
+        Builds the embedding layer, that embeds
+        all ngram features (up to `max_order`) in
+        one lookup (see `NgramEmbedding`).
 
         :param max_order:
         :return:
         """
-        for order in range(max_order):
-            # build one embedding layer for e-
-            # ach ngram order, while increasi-
-            # ng the embedding dimension as t-
-            # he ngram order increases:
-            embedding_dim = int(32 * (order+1))
-            self.embedding_len += embedding_dim
-            self.__setattr__(
-                f'ngram_embedds_{order+1}',
-                nn.Embedding(
-                    num_embeddings=len(self.lexicons_[order]),
-                    padding_idx=self.lexicons_[order][ '#' ] ,
-                    embedding_dim=embedding_dim
-                ).to(DEVICE)
-            )
+        # one block of embeddings for each
+        # ngram order:
+        dims = self.embedding_dims(max_order)
+
+        self.ngram_embedds = NgramEmbedding(
+            sizes=[len(self.lexicons_[order]) for order in range(max_order)],
+            paddings=[self.lexicons_[order]['#'] for order in range(max_order)],
+            dims=dims
+        ).to(DEVICE)
+        self.embedding_len += sum(dims)
 
-    def _init_hidden(self, batch_size):
+        # models saved before the embeddings
+        # were fused have one embedding lay-
+        # er per order (`ngram_embedds_{k}`):
+        self._register_load_state_dict_pre_hook(
+                        self._load_ngram_embedds)
+
+    def _load_ngram_embedds(self, state_dict, prefix, *args):
         """
-        Initializes the hidden layers and cells of
-        the lstm with random numbers within [0, 1].
+        Packs per-order embedding weights found in
+        `state_dict` in the fused embedding table.
 
-        :param batch_size:
+        :param state_dict:
+        :param prefix:
+        :param args:
         :return:
         """
-        self.h = torch.zeros((self.num_layers, batch_size, self.hidden_dim))
-        self.c = torch.zeros((self.num_layers, batch_size, self.hidden_dim))
-        self.h.to(DEVICE)
-        self.c.to(DEVICE)
+        orders = range(1, len(self.ngram_embedds.sizes) + 1)
+        legacy = [f'{prefix}ngram_embedds_{order}.weight' for order in orders]
 
-    def _ngram_embedds(self, order):
+        if all(key in state_dict for key in legacy):
+            state_dict[f'{prefix}ngram_embedds.weight'] = self.ngram_embedds.pack([
+                state_dict.pop(key) for key in legacy
+            ])
+
+    def _init_hidden(self, batch_size):
         """
-        Return the embedding layer f-
-        or the specified ngram order.
+        Initializes the hidden layers and cells of
+        the lstm with zeros. They are returned, ra-
+        ther than kept on the encoder, so that con-
+        current forward passes do not share them.
 
-        :param order:
+        :param batch_size:
         :return:
         """
-        return self.__getattr__(f'ngram_embedds_{order}')
+        h = torch.zeros((self.num_layers, batch_size, self.hidden_dim))
+        c = torch.zeros((self.num_layers, batch_size, self.hidden_dim))
+
+        return h.to(DEVICE), c.to(DEVICE)
 
     def compute_embeddings(self, x):
         """
@@ -112,16 +127,7 @@ class LSTMEncoder(Encoder):
         :param x:
         :return:
         """
-
-        shape = x.size()[:-1]
-
-        x = x.long()
-        x = torch.cat([
-            self._ngram_embedds(i + 1)(x[:, :, i:i + 1])
-            for i in range(x.size()[-1])
-        ], -1)
-
-        return x.view(*shape, self.elen)
+        return self.ngram_embedds(x)
 
     def batchsort(self, batch):
         """
@@ -132,10 +138,10 @@ class LSTMEncoder(Encoder):
         :param batch:
         :return:
         """
-        lengths = torch.tensor([
-            len(list(filter(lambda s: torch.max(s), sequence)))
-            for sequence in batch
-        ])
+        # padding elements are embedded to
+        # all-zero vectors, the others are
+        # counted in one go:
+        lengths = (batch.max(dim=-1).values != 0).sum(dim=-1)
         sorted_lens, sorted_ix = lengths.sort(descending=True)
 
         _, unsorted_ix = sorted_ix.sort()
@@ -145,8 +151,8 @@ class LSTMEncoder(Encoder):
 
     def forward(self, x):
         batch_size = x.size()[0]
-        self._init_hidden(
-               batch_size)
+        h, c = self._init_hidden(
+                    batch_size)
 
         # compute embedding for each ngram
         # in the sequence, then concatena-
@@ -162,27 +168,27 @@ class LSTMEncoder(Encoder):
           batch_first=True
         )
 
-        x, (self.h, self.c) = self.lstm(x, (self.h, self.c))
-
-        x, _ = pad_packed_sequence(
-         x, total_length=self.slen,
-         batch_first=True)
-
-        x = torch.index_select(x, 0, unsorted_ix)
+        x, (h, c) = self.lstm(x, (h, c))
 
         if not self.ret_sequences:
             # return last element of sequences
-            # but exclude all padding elements
-            real_lengths = torch.index_select(
-                  sorted_lens, 0, unsorted_ix)
+            # but exclude all padding elements:
+            # that's the last layer's hidden s-
+            # tate, as the lstm stops at the l-
+            # ast real element of each packed
+            # sequence - no need to unpad them.
+            x = torch.index_select(
+                h[-1], 0, unsorted_ix)
 
-            column_index = real_lengths - 1
+            return x, (h, c)
 
-            row_index = torch.arange(len(x))
+        x, _ = pad_packed_sequence(
+         x, total_length=self.slen,
+         batch_first=True)
 
-            x = x[ row_index, column_index ]
+        x = torch.index_select(x, 0, unsorted_ix)
 
-        return x, (self.h, self.c)
+        return x, (h, c)
 
 
 class LiteEncoder(LSTMEncoder):
@@ -252,3 +258,23 @@ class LiteEncoder(LSTMEncoder):
         # of interest
 
         return x
+
+
+class StudentEncoder(LSTMEncoder):
+    """
+    Smaller version of the LSTMEncoder, over all
+    ngram orders too, meant to be distilled from
+    a trained LSTMEncoder (see `colorito.nnet.di-
+    still`), to embed names faster.
+    """
+
+    @property
+    def hidden_dim(self):
+        return 128
+
+    @property
+    def num_layers(self):
+        return 1
+
+    def embedding_dims(self, max_order):
+        return [int(16 * (order+1)) for order in range(max_order)]
@@ -0,0 +1,203 @@
+from colorito.data.vectorize import NgramVectorizer
+from colorito.nnet.model import ColorGenerator
+from colorito.utils.logs import setup_logger
+
+from collections import OrderedDict
+
+import threading
+import hashlib
+import os
+
+
+logger = setup_logger('color-generator:registry')
+
+
+class SharedModel(object):
+    """
+    A ColorGenerator loaded once for inference, al-
+    ong with the vectorizer of its lexicons, that
+    any number of users (e.g. SmartPalettes) share.
+
+    The network is in eval mode, with gradients
+    disabled: it should be treated as read-only.
+    """
+
+    def __init__(self, key, nnet, vectorizer):
+        self.key = key
+        self.nnet = nnet
+        self.vectorizer = vectorizer
+        self.refs = 0
+
+
+class ModelRegistry(object):
+    """
+    Process-wide cache of `SharedModel`s, keyed by
+    the (real) path of the model and a hash of its
+    content, so that a model replaced on disk is lo-
+    aded again rather than served stale.
+
+    Hashes are kept by path, along with the size
+    and modification time of each file, and only
+    computed again when these change, so acquiring
+    a loaded model reads no file.
+
+    `acquire` hands out the shared model (loading
+    it at first), counting references; `release`
+    gives one back. Models no one holds are kept,
+    least recently released first, up to `max_id-
+    le` of them, then evicted.
+    """
+
+    def __init__(self, max_idle=1):
+        """
+        :param max_idle: unreferenced models to keep.
+        """
+        self.max_idle = max_idle
+
+        self.models = {}
+        self.hashes = {}
+        self.idle = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, path):
+        """
+        Returns the shared model saved at `path` (a
+        directory or a bundle), adding a reference.
+
+        :param path:
+        :return:
+        """
+        with self.lock:
+            key = (os.path.realpath(path), self._hash(path))
+            model = self.models.get(key)
+
+            if model is None:
+                # models replaced on disk are not
+                # going to be acquired anymore:
+                for key_ in [key_ for key_ in self.idle if key_[0] == key[0]]:
+                    self._evict(key_)
+
+                logger.info(f' loading {path}...')
+                model = self.models[key] = _shared(key, path)
+
+            self.idle.pop(key, None)
+            model.refs += 1
+
+        return model
+
+    def release(self, model):
+        """
+        Gives back a reference to a shared model.
+
+        :param model:
+        :return:
+        """
+        with self.lock:
+            if self.models.get(model.key) is not model or model.refs <= 0:
+                return
+
+            model.refs -= 1
+            if model.refs:
+                return
+
+            self.idle[model.key] = model
+            while len(self.idle) > self.max_idle:
+                self._evict(next(iter(self.idle)))
+
+    def clear(self):
+        """
+        Evicts the models no one holds.
+
+        :return:
+        """
+        with self.lock:
+            for key in list(self.idle):
+                self._evict(key)
+
+    def _hash(self, path):
+        """
+        Hash of the model's content (see `content_
+        hash`), computed again only if the stat of
+        any of its files changed.
+
+        :param path:
+        :return:
+        """
+        real = os.path.realpath(path)
+        stats = _stats(real)
+
+        cached = self.hashes.get(real)
+        if cached is None or cached[0] != stats:
+            cached = self.hashes[real] = (stats, content_hash(real))
+
+        return cached[1]
+
+    def _evict(self, key):
+        logger.info(f' evicting {key[0]}...')
+
+        del self.idle[key]
+        del self.models[key]
+
+    def __contains__(self, path):
+        return any(key[0] == os.path.realpath(path) for key in self.models)
+
+    def __len__(self):
+        return len(self.models)
+
+
+def content_hash(path, chunk=2 ** 20):
+    """
+    SHA-256 of a model's files (or file, if it is
+    a bundle), along with their relative paths.
+
+    :param path:
+    :param chunk:
+    :return:
+    """
+    files = _files(path)
+
+    digest = hashlib.sha256()
+    for fi in files:
+        digest.update(os.path.relpath(fi, path).encode('utf-8'))
+        with open(fi, 'rb') as f:
+            for block in iter(lambda: f.read(chunk), b''):
+                digest.update(block)
+
+    return digest.hexdigest()
+
+
+def _files(path):
+    if os.path.isfile(path):
+        return [path]
+
+    return sorted(
+        os.path.join(root, fi)
+        for root, _, fis in os.walk(path) for fi in fis
+    )
+
+
+def _stats(path):
+    # what changes when a file is replaced
+    # (or rewritten) on disk:
+    stats = []
+    for fi in _files(path):
+        stat = os.stat(fi)
+        stats.append((fi, stat.st_size, stat.st_mtime_ns))
+
+    return stats
+
+
+def _shared(key, path):
+    nnet = ColorGenerator.load(path)
+    nnet.eval()
+    nnet.requires_grad_(False)
+
+    lexicons = nnet.encoder.lexicons_
+    vectorizer = NgramVectorizer(order=len(lexicons))
+    vectorizer.lexicons = lexicons
+
+    return SharedModel(key, nnet, vectorizer)
+
+
+# the registry SmartPalettes share models from:
+models = ModelRegistry()
@@ -0,0 +1,463 @@
+from colorito import COLORS, MODELS
+
+from colorito.utils.logs import setup_logger
+from colorito.utils.fs import mkdir
+
+from colorito.data.vectorize import NgramVectorizer, HashingVectorizer
+from colorito.data.dataset import ColorDataset
+
+from colorito.nnet.model import ColorGenerator
+from colorito.nnet.train import train, defaults as train_defaults
+from colorito.nnet.latency import latency, sample_names
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+
+import itertools
+import statistics
+import inspect
+import argparse
+import random
+import time
+import ast
+import csv
+import os
+
+
+defaults = {
+    'data': COLORS,
+    'output': os.path.join(MODELS, 'sweep'),
+    'jobs': 1,
+    'threads': 0,
+    'trials': 0,
+    'seed': 0,
+    'epochs': train_defaults['epochs'],
+    'validation': 0.1,
+    'grace': 1,
+    'min_trials': 3,
+    'queries': 100
+}
+
+# arguments of train() that can not be searched:
+# the sweep sets the output and the callback of
+# each trial, and trials run on a single process
+# (multi-process training returns no model path,
+# and could not report back to the sweep).
+UNSEARCHABLE = ('output', 'callback', 'processes')
+
+logger = setup_logger('color-generator:sweep')
+
+
+def sweep(
+    space,
+    data=defaults['data'],
+    output=defaults['output'],
+    jobs=defaults['jobs'],
+    threads=defaults['threads'],
+    trials=defaults['trials'],
+    seed=defaults['seed'],
+    cache=None,
+    epochs=defaults['epochs'],
+    validation=defaults['validation'],
+    grace=defaults['grace'],
+    min_trials=defaults['min_trials'],
+    queries=defaults['queries']
+):
+    """
+    Trains a ColorGenerator for each configuration
+    of the search space, `jobs` at a time, and ranks
+    them by validation loss.
+
+    Trials are stopped early (median stopping rule)
+    if, after an epoch, their validation loss is wo-
+    rse than the median loss of the other trials at
+    the same epoch. The preprocessed data is cached
+    once, and shared by all the trials.
+
+    Ranked results, along with the inference laten-
+    cy of each model (median time to embed a single
+    color name), are written to `results.csv`.
+
+    :param space: dict mapping arguments of `train`
+                  to the list of values to try (but
+                  `UNSEARCHABLE` ones).
+    :param data:
+    :param output: directory where trials are saved.
+    :param jobs: number of trials run in parallel.
+    :param threads: intra-op threads per trial (0:
+                    cores are shared among trials).
+    :param trials: if > 0, run this many configura-
+                   tions picked at random from the
+                   grid, rather than the whole grid.
+    :param seed:
+    :param cache: directory of the shared dataset ca-
+                  che (defaults to `output/cache`).
+    :param epochs:
+    :param validation: fraction of held out data.
+    :param grace: epochs before trials can be stopped.
+    :param min_trials: trials that must have reached
+                       an epoch before others can be
+                       stopped there.
+    :param queries: names embedded to measure latency.
+    :return: the ranked results.
+    """
+    unknown = set(space) - set(inspect.signature(train).parameters)
+    if unknown:
+        raise ValueError(
+            f' Invalid search space: {", ".join(sorted(unknown))}'
+            f' are not arguments of train().'
+        )
+
+    unsearchable = set(space) & set(UNSEARCHABLE)
+    if unsearchable:
+        raise ValueError(
+            f' Invalid search space: {", ".join(sorted(unsearchable))}'
+            f' can not be searched: trials run on one process,'
+            f' with their output and callback set by the sweep.'
+        )
+
+    if not validation:
+        raise ValueError(
+            f' Can not rank trials without validation data.'
+        )
+
+    mkdir(output)
+    cache = cache or os.path.join(output, 'cache')
+
+    settings = [
+        {
+            'data': data,
+            'cache': cache,
+            'epochs': epochs,
+            'validation': validation,
+            'threads': threads or max(1, os.cpu_count() // jobs),
+            **config
+        }
+        for config in configs(space, trials=trials, seed=seed)
+    ]
+
+    logger.info(
+        f' will run {len(settings)} trials, {jobs} at a time'
+        f' ({settings[0]["threads"]} threads each)...'
+    )
+
+    _prepare(settings)
+
+    results = []
+    with Manager() as manager:
+        # validation loss of each (trial, epoch):
+        reports = manager.dict()
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(
+                    _trial,
+                    trial,
+                    settings_,
+                    output,
+                    reports,
+                    grace,
+                    min_trials
+                )
+                for trial, settings_ in enumerate(settings)
+            ]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    names = sample_names(data, queries, seed)
+    for result in results:
+        result['latency_ms'] = latency(
+            ColorGenerator.load(result['path']), names)
+
+    results.sort(key=lambda result: result['valid_loss'])
+    _write(results, list(space), os.path.join(output, 'results.csv'))
+
+    return results
+
+
+def configs(space, trials=0, seed=0):
+    """
+    Lists the configurations of the grid over the
+    search space; if `trials` > 0, only as many of
+    them, picked at random.
+
+    :param space:
+    :param trials:
+    :param seed:
+    :return:
+    """
+    names = list(space)
+    grid = [
+        dict(zip(names, values)) for values in
+        itertools.product(*(space[name] for name in names))
+    ]
+
+    if trials and trials < len(grid):
+        grid = random.Random(seed).sample(grid, trials)
+
+    return grid
+
+
+def _prepare(settings):
+    """
+    Builds the cache entry of each distinct prepro-
+    cessing of the data, before trials start and
+    would build it concurrently.
+
+    :param settings:
+    :return:
+    """
+    prepared = set()
+    for settings_ in settings:
+        if settings_.get('stream'):
+            continue
+
+        ngrams = settings_.get('ngrams', train_defaults['ngrams'])
+        wbound = settings_.get('wbound', False)
+        hashing = settings_.get('hashing', train_defaults['hashing'])
+
+        if (ngrams, wbound, hashing) in prepared:
+            continue
+        prepared.add((ngrams, wbound, hashing))
+
+        if hashing:
+            vectorz = HashingVectorizer(ngrams, bound=wbound, buckets=hashing)
+        else:
+            vectorz = NgramVectorizer(ngrams, bound=wbound)
+
+        ColorDataset.build(
+            settings_['data'],
+            vectorizer=vectorz,
+            space='lab',
+            jobs=settings_.get('jobs', train_defaults['jobs']),
+            cache=settings_['cache']
+        )
+
+
+def _trial(trial, settings, output, reports, grace, min_trials):
+    """
+    Runs a trial, stopping it early if its valid-
+    ation loss falls behind the other trials'.
+
+    :param trial:
+    :param settings:
+    :param output:
+    :param reports:
+    :param grace:
+    :param min_trials:
+    :return:
+    """
+    output = os.path.join(output, f'trial-{trial:03d}')
+    mkdir(output)
+
+    losses = []
+
+    def median_stopping(epoch, loss):
+        losses.append(loss)
+        reports[(trial, epoch)] = loss
+
+        others = [
+            loss_ for (trial_, epoch_), loss_ in reports.items()
+            if epoch_ == epoch and trial_ != trial
+        ]
+
+        return (
+            epoch + 1 >= grace and
+            len(others) >= min_trials and
+            loss > statistics.median(others)
+        )
+
+    logger.info(f' trial {trial}: {settings}')
+
+    tick = time.perf_counter()
+    path = train(output=output, callback=median_stopping, **settings)
+
+    return {
+        'trial': trial,
+        **settings,
+        'valid_loss': losses[-1],
+        'epochs_run': len(losses),
+        'stopped': len(losses) < settings['epochs'],
+        'train_s': time.perf_counter() - tick,
+        'path': path
+    }
+
+
+def _write(results, params, path):
+    """
+    Writes the ranked results to a csv file, and
+    logs them as a table.
+
+    :param results:
+    :param params: names of the searched arguments.
+    :param path:
+    :return:
+    """
+    columns = [
+        'rank', 'trial', *params, 'valid_loss', 'epochs_run',
+        'stopped', 'train_s', 'latency_ms', 'path'
+    ]
+
+    rows = [
+        {
+            'rank': rank,
+            **{column: result[column] for column in columns[1:]}
+        }
+        for rank, result in enumerate(results, start=1)
+    ]
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    cells = [columns[:-1]] + [
+        [
+            f'{row[column]:.4g}' if isinstance(row[column], float)
+            else str(row[column]) for column in columns[:-1]
+        ]
+        for row in rows
+    ]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(columns) - 1)]
+
+    logger.info(f' results (also in {path}):')
+    for row in cells:
+        logger.info(' ' + '  '.join(
+            cell.rjust(width) for cell, width in zip(row, widths)
+        ))
+
+
+def _parse(assignment):
+    """
+    Parses a `name=value,value,...` assignment
+    of the search space.
+
+    :param assignment:
+    :return:
+    """
+    name, _, values = assignment.partition('=')
+    if not values:
+        raise argparse.ArgumentTypeError(
+            f' Invalid search space entry: {assignment}'
+            f' (should be name=value,value,...)'
+        )
+
+    def literal(value):
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return value
+
+    return name, [literal(value) for value in values.split(',')]
+
+
+def argument_parser():
+
+    parser = argparse.ArgumentParser(
+        description='Colorito command line: sweep '
+                    'hyperparameters of a ColorGe'
+                    'nerator!'
+    )
+    parser.add_argument(
+        'space',
+        nargs='+',
+        type=_parse,
+        help='Search space, as name=value,value,'
+             '... entries (names are arguments '
+             'of train, e.g. ngrams=2,3 lite=Tr'
+             'ue,False)'
+    )
+    parser.add_argument(
+        '-d',
+        '--data',
+        default=defaults['data'],
+        help='Path to the folder containing '
+             'the csv with colors'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        default=defaults['output'],
+        help='Path to where the trials and the'
+             ' results are saved'
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        default=defaults['jobs'],
+        type=int,
+        help='Number of trials run in parallel'
+    )
+    parser.add_argument(
+        '--threads',
+        default=defaults['threads'],
+        type=int,
+        help='Number of threads per trial (0 t'
+             'o share the cores among trials)'
+    )
+    parser.add_argument(
+        '--trials',
+        default=defaults['trials'],
+        type=int,
+        help='Number of configurations picked '
+             'at random (0 to run the whole gr'
+             'id)'
+    )
+    parser.add_argument(
+        '--seed',
+        default=defaults['seed'],
+        type=int,
+        help='Seed of the random search'
+    )
+    parser.add_argument(
+        '--cache',
+        default=None,
+        help='Path to the folder where the pre'
+             'processed data is cached (defaul'
+             'ts to the output folder)'
+    )
+    parser.add_argument(
+        '-e',
+        '--epochs',
+        default=defaults['epochs'],
+        type=int,
+        help='Number of training epochs'
+    )
+    parser.add_argument(
+        '--validation',
+        default=defaults['validation'],
+        type=float,
+        help='Fraction of the data held out to'
+             ' rank the trials'
+    )
+    parser.add_argument(
+        '--grace',
+        default=defaults['grace'],
+        type=int,
+        help='Epochs before a trial can be sto'
+             'pped early'
+    )
+    parser.add_argument(
+        '--min_trials',
+        default=defaults['min_trials'],
+        type=int,
+        help='Trials that must reach an epoch '
+             'before others are stopped there'
+    )
+    parser.add_argument(
+        '--queries',
+        default=defaults['queries'],
+        type=int,
+        help='Number of names embedded to meas'
+             'ure inference latency'
+    )
+
+    return parser
+
+
+if __name__ == '__main__':
+
+    args = vars(argument_parser().parse_args())
+    args['space'] = dict(args['space'])
+
+    sweep(**args)
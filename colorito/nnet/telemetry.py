@@ -0,0 +1,191 @@
+from torch.profiler import ProfilerActivity, profile, record_function, schedule
+from contextlib import contextmanager, nullcontext
+
+import json
+import time
+import sys
+import csv
+
+try:
+    import resource
+except ImportError:  # e.g. on Windows
+    resource = None
+
+
+class Telemetry(object):
+    """
+    Records how long each training step spends in
+    each of its `STAGES` (loading data, forward pa-
+    ss, loss, backward pass and optimizer step), al-
+    ong with throughput, memory high-water mark and
+    loss, one row per step, to a JSONL (or CSV, if
+    the path ends with `.csv`) metrics file.
+
+    Optionally, a window of steps is traced with
+    the torch profiler, to a Chrome trace file.
+    """
+
+    STAGES = ('data', 'forward', 'loss', 'backward', 'step')
+
+    FIELDS = (
+        'epoch', 'step', 'time', 'samples', 'loss', 'lr',
+        *(f'{stage}_s' for stage in STAGES),
+        'samples_per_s', 'maxrss_mb'
+    )
+
+    def __init__(self, path=None, trace=None, trace_start=10, trace_steps=5):
+        """
+        :param path: metrics file (none if None).
+        :param trace: Chrome trace file (none if None).
+        :param trace_start: steps before tracing starts.
+        :param trace_steps: steps traced.
+        """
+        self.path = path
+        self.file, self.writer = None, None
+        if path is not None:
+            self.file = open(path, 'w', newline='')
+            if path.endswith('.csv'):
+                self.writer = csv.DictWriter(self.file, self.FIELDS)
+                self.writer.writeheader()
+
+        self.profiler = None
+        if trace is not None:
+            self.profiler = profile(
+                activities=[ProfilerActivity.CPU],
+                schedule=schedule(
+                    wait=trace_start,
+                    warmup=1,
+                    active=trace_steps,
+                    repeat=1
+                ),
+                on_trace_ready=lambda prof: prof.export_chrome_trace(trace)
+            )
+            self.profiler.start()
+
+        self.start = time.perf_counter()
+        self.timings = dict.fromkeys(self.STAGES, 0.)
+        self.totals = dict.fromkeys(self.STAGES, 0.)
+        self.samples = 0
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times (and, when tracing, labels) a stage
+        of the current step.
+
+        :param name:
+        :return:
+        """
+        traced = record_function(name) if self.profiler else nullcontext()
+
+        tick = time.perf_counter()
+        with traced:
+            yield
+        self.timings[name] += time.perf_counter() - tick
+
+    def batches(self, batches):
+        """
+        Yields the batches, timing the time spent
+        waiting for each one as the `data` stage.
+
+        :param batches:
+        :return:
+        """
+        batches = iter(batches)
+        while True:
+            with self.stage('data'):
+                batch = next(batches, None)
+            if batch is None:
+                return
+
+            yield batch
+
+    def step(self, epoch, step, samples, loss, lr):
+        """
+        Closes the current step, recording it.
+
+        :param epoch:
+        :param step:
+        :param samples: number of samples in the step.
+        :param loss:
+        :param lr:
+        :return:
+        """
+        seconds = sum(self.timings.values())
+
+        record = {
+            'epoch': epoch,
+            'step': step,
+            'time': time.perf_counter() - self.start,
+            'samples': samples,
+            'loss': loss,
+            'lr': lr,
+            **{
+                f'{stage}_s': timing
+                for stage, timing in self.timings.items()
+            },
+            'samples_per_s': samples / seconds if seconds else None,
+            'maxrss_mb': self.maxrss()
+        }
+        self._write(record)
+
+        for stage, timing in self.timings.items():
+            self.totals[stage] += timing
+            self.timings[stage] = 0.
+        self.samples += samples
+
+        if self.profiler is not None:
+            self.profiler.step()
+
+        return record
+
+    def epoch(self):
+        """
+        Returns the time spent in each stage and
+        the samples seen since the last call.
+
+        :return:
+        """
+        totals, samples = dict(self.totals), self.samples
+
+        self.totals = dict.fromkeys(self.STAGES, 0.)
+        self.samples = 0
+
+        return totals, samples
+
+    def close(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    @staticmethod
+    def maxrss():
+        """
+        Peak resident memory of the process, in MB
+        (None where it is not available).
+
+        :return:
+        """
+        if resource is None:
+            return None
+
+        # kilobytes on Linux, bytes on macOS:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        scale = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+
+        return maxrss / scale
+
+    def _write(self, record):
+        if self.file is None:
+            return
+
+        if self.writer is not None:
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + '\n')
+
+        self.file.flush()
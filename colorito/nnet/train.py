@@ -2,20 +2,33 @@ from colorito import COLORS, DEVICE, MODELS
 
 from colorito.utils.logs import setup_logger
 
-from colorito.data.vectorize import NgramVectorizer
+from colorito.data.vectorize import NgramVectorizer, HashingVectorizer
 from colorito.data.dataset import ColorDataset
+from colorito.data.stream import ColorStream
+from colorito.data.sampler import BucketBatchSampler
 
 from colorito.nnet.model import ColorGenerator
+from colorito.nnet.telemetry import Telemetry
 from colorito.nnet.modules.encoders.lstm import LSTMEncoder, LiteEncoder
+from colorito.nnet.modules.encoders.bag import BagEncoder
 
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data.dataloader import DataLoader
+from torch.utils.data.distributed import DistributedSampler
+from torch.utils.data import Subset, random_split
+from contextlib import nullcontext
 from datetime import datetime
 from tqdm.autonotebook import tqdm
 
 import torch
 import torch.nn as nn
+import torch.distributed as dist
+import torch.multiprocessing as mp
 import numpy as np
 import argparse
+import logging
+import random
+import socket
 import os
 
 
@@ -26,9 +39,24 @@ defaults = {
     'epochs': 5,
     'batch_size': 32,
     'learning_rate': 1e-03,
-    'decay': 0.0
+    'decay': 0.0,
+    'hashing': 0,
+    'jobs': 1,
+    'length': 35,
+    'buffer': 10000,
+    'workers': 0,
+    'prefetch': 2,
+    'validation': 0.0,
+    'threads': 0,
+    'interop_threads': 0,
+    'processes': 1,
+    'checkpoint_every': 0,
+    'trace_start': 10,
+    'trace_steps': 5
 }
 
+ENCODERS = ('lstm', 'lite', 'bag')
+
 logger = setup_logger('color-generator:train')
 
 
@@ -41,7 +69,32 @@ def train(
     learning_rate=defaults['learning_rate'],
     decay=defaults['decay'],
     lite=True,
-    wbound=False
+    wbound=False,
+    hashing=defaults['hashing'],
+    jobs=defaults['jobs'],
+    bucket=False,
+    cache=None,
+    stream=False,
+    length=defaults['length'],
+    buffer=defaults['buffer'],
+    workers=defaults['workers'],
+    prefetch=defaults['prefetch'],
+    persistent=False,
+    validation=defaults['validation'],
+    threads=defaults['threads'],
+    interop_threads=defaults['interop_threads'],
+    bf16=False,
+    compile_=False,
+    processes=defaults['processes'],
+    checkpoint=None,
+    checkpoint_every=defaults['checkpoint_every'],
+    resume=False,
+    metrics=None,
+    trace=None,
+    trace_start=defaults['trace_start'],
+    trace_steps=defaults['trace_steps'],
+    callback=None,
+    encoder=None
 ):
     """
     Trains a neural network to generate colors from text data;
@@ -56,11 +109,110 @@ def train(
     :param decay:
     :param lite:
     :param wbound:
-    :return:
+    :param hashing: if > 0, hash n-grams of each
+                    order to this many buckets,
+                    rather than building lexicons.
+    :param jobs: number of processes used to vec-
+                 torize the training data.
+    :param bucket: batch together names of similar
+                   length (see `BucketBatchSampler`).
+    :param cache: directory where the preprocessed
+                  dataset is cached between runs.
+    :param stream: stream the data from the csv files
+                   rather than loading it in memory
+                   (see `ColorStream`).
+    :param length: names' length, when streaming.
+    :param buffer: shuffle buffer size, when streaming.
+    :param workers: number of processes loading the
+                    batches, while training goes on.
+    :param prefetch: batches loaded ahead per worker.
+    :param persistent: keep workers alive across epochs.
+    :param validation: fraction of the data held out
+                       to compute a validation loss
+                       after each epoch.
+    :param threads: number of intra-op threads (0
+                    leaves torch's default).
+    :param interop_threads: number of inter-op threads.
+    :param bf16: run forward and loss in bfloat16 (on
+                 CPUs with native support); expect a
+                 validation loss within 5% of float32.
+    :param compile_: train a `torch.compile`d network.
+    :param processes: if > 1, train on as many processes
+                      (data-parallel, gloo backend): each
+                      process trains on its own share of
+                      every epoch, and gradients are all-
+                      reduced after each backward pass.
+    :param checkpoint: directory where a checkpoint (mo-
+                       del, optimizer, scheduler, RNGs
+                       and position in the epoch) is
+                       saved after each epoch.
+    :param checkpoint_every: also checkpoint every this
+                             many batches (0: never).
+    :param resume: resume training from the checkpoint,
+                   if any; the data must be the same.
+    :param metrics: file where per-step timings of each
+                    stage (see `Telemetry`), throughput,
+                    memory and loss are written (JSONL,
+                    or CSV if it ends with `.csv`).
+    :param trace: file where a torch profiler (Chrome)
+                  trace of some steps is written.
+    :param trace_start: steps before the trace starts.
+    :param trace_steps: number of steps traced.
+    :param callback: called after each epoch with the
+                     epoch and the validation loss (None
+                     without validation data); training
+                     stops early if it returns True.
+    :param encoder: `lstm`, `lite` or `bag` (see `Bag-
+                    Encoder`); overrides `lite`.
+    :return: path of the saved model (None when training
+             on several processes).
     """
 
+    if resume and checkpoint is None:
+        raise ValueError(
+            f' Can not resume training: no checkpoint given.'
+        )
+
+    if processes > 1:
+        settings = {
+            name: value for name, value in locals().items()
+            if name != 'processes'
+        }
+        if not threads:
+            # share the cores among processes:
+            settings['threads'] = max(1, os.cpu_count() // processes)
+
+        logger.info(f' will train on {processes} processes...')
+        mp.spawn(
+            _distributed,
+            args=(processes, _free_port(), settings),
+            nprocs=processes
+        )
+        return
+
+    rank, replicas = 0, 1
+    if dist.is_available() and dist.is_initialized():
+        rank, replicas = dist.get_rank(), dist.get_world_size()
+
+    _configure_threads(threads, interop_threads)
+
+    if bf16 and not _bf16_supported():
+        logger.warning(
+            ' bfloat16 is not natively supported by this CPU:'
+            ' will train in float32.'
+        )
+        bf16 = False
+
+    encoder = encoder or ('lite' if lite else 'lstm')
+    if encoder not in ENCODERS:
+        raise ValueError(
+            f' Invalid encoder: {encoder} - must be'
+            f' one of: {", ".join(ENCODERS)}.'
+        )
+
     logger.info(
-        f' will train a {"lite " if lite else ""}ColorGenerator.'
+        f' will train a {"" if encoder == "lstm" else encoder + " "}'
+        f'ColorGenerator.'
     )
 
     if not os.path.isdir(output):
@@ -73,17 +225,54 @@ def train(
         f'(n-grams with{"out" if not wbound else ""} word bounds)'
     )
 
-    vectorz = NgramVectorizer(ngrams, bound=wbound)
-    dataset = ColorDataset.build(
-        data,
-        vectorizer=vectorz,
-        space='lab'
-    )
+    if hashing:
+        logger.info(f' hashing n-grams of each order to {hashing} buckets')
+        vectorz = HashingVectorizer(ngrams, bound=wbound, buckets=hashing)
+    else:
+        vectorz = NgramVectorizer(ngrams, bound=wbound)
+
+    if stream:
+        dataset = ColorStream(
+            data,
+            vectorizer=vectorz,
+            length=length,
+            space='lab',
+            buffer=buffer,
+            replicas=replicas,
+            rank=rank
+        )
+        # lexicons are fitted on a first pass
+        # over the stream (no-op if hashing):
+        vectorz.fit(dataset.names(), jobs=jobs)
+
+        input_dim = (length, ngrams)
+    else:
+        if cache is not None and rank > 0:
+            # wait for rank 0 to fill the cache:
+            dist.barrier()
+
+        dataset = ColorDataset.build(
+            data,
+            vectorizer=vectorz,
+            space='lab',
+            jobs=jobs,
+            cache=cache
+        )
+
+        if cache is not None and rank == 0 and replicas > 1:
+            dist.barrier()
+
+        input_dim = tuple(dataset.x[0].size())
 
     logger.info(f' assembling the network...')
 
-    input_dim = tuple(dataset.x[0].size())
-    if lite:
+    if encoder == 'bag':
+        encoder = BagEncoder(
+            input_dim=input_dim,
+            lexicons_=vectorz.lexicons,
+            max_ngram_order=ngrams
+        )
+    elif encoder == 'lite':
         encoder = LiteEncoder(
             input_dim=input_dim,
             lexicons_=vectorz.lexicons,
@@ -108,63 +297,226 @@ def train(
         )
     )
 
+    # the model that is trained shares its
+    # parameters with `cg`, which is saved.
+    model = cg
+    if replicas > 1:
+        # parameters are broadcast from rank
+        # 0, so all replicas start the same.
+        model = ddp = DistributedDataParallel(cg)
+    if compile_:
+        logger.info(f' compiling the network...')
+        model = torch.compile(model)
+
+    valid_loader = None
+    if validation:
+        if stream:
+            raise ValueError(
+                f' Can not hold out validation data when streaming.'
+            )
+
+        n_valid = int(len(dataset) * validation)
+        dataset, valid_set = random_split(
+            dataset,
+            [len(dataset) - n_valid, n_valid],
+            generator=torch.Generator().manual_seed(0)
+        )
+        valid_loader = DataLoader(
+            valid_set, batch_size,
+            collate_fn=ColorDataset.collate
+        )
+
     criterion_ = nn.MSELoss()
-    dataloader = DataLoader(
-        dataset, batch_size,
-        shuffle=True
+    dataloader = _dataloader(
+        dataset,
+        batch_size,
+        bucket=bucket,
+        workers=workers,
+        prefetch=prefetch,
+        persistent=persistent,
+        replicas=replicas,
+        rank=rank
     )
 
-    # train the model
+    # learning rate decays linearly, by `decay`
+    # per epoch; the optimizer is kept across
+    # epochs, along with its moment estimates.
+    optimizer = torch.optim.Adam(
+        cg.parameters(),
+        lr=learning_rate
+    )
+    scheduler = torch.optim.lr_scheduler.LambdaLR(
+        optimizer,
+        lambda epoch: 1. - epoch * decay / learning_rate
+    )
+
+    state = None
+    if resume:
+        state = _load_checkpoint(checkpoint)
 
-    for epoch in range(epochs):
+    first_epoch, first_step = 0, 0
+    if state is not None:
+        cg.load_state_dict(state['model'])
+        optimizer.load_state_dict(state['optimizer'])
+        scheduler.load_state_dict(state['scheduler'])
+        if stream:
+            dataset.iterations = state['iterations']
 
-        lr = learning_rate - epoch * decay
-        optimizer = torch.optim.Adam(
-            cg.parameters(),
-            lr=lr
+        first_epoch, first_step = state['epoch'], state['step']
+        logger.info(
+            f' resuming from epoch {first_epoch + 1}, '
+            f'after {first_step} batches...'
         )
 
+    # only rank 0 reports:
+    telemetry = Telemetry(
+        metrics if rank == 0 else None,
+        trace=trace if rank == 0 else None,
+        trace_start=trace_start,
+        trace_steps=trace_steps
+    )
+
+    # train the model
+
+    for epoch in range(first_epoch, epochs):
+
+        lr = scheduler.get_last_lr()[0]
+
         avg_epoch_loss, loss = [], None
 
+        # batches of the epoch are drawn from the
+        # RNG state at its start (and a stream is
+        # shuffled by its iterations so far): res-
+        # toring them (and skipping the batches al-
+        # ready trained on) resumes the epoch where
+        # it was left off.
+        skip = 0
+        if state is not None and epoch == first_epoch:
+            _set_rng_state(state['epoch_rng'])
+            skip = first_step
+        epoch_rng = _rng_state()
+        epoch_iterations = getattr(dataset, 'iterations', 0)
+
+        if stream:
+            dataset.set_epoch(epoch)
+        elif hasattr(dataloader.batch_sampler, 'set_epoch'):
+            dataloader.batch_sampler.set_epoch(epoch)
+        elif hasattr(dataloader.sampler, 'set_epoch'):
+            dataloader.sampler.set_epoch(epoch)
+
         logger.info(
             f' Epoch {epoch + 1}/{epochs} will '
             f'run with a learning rate of: {lr}'
         )
         pbar = tqdm(
-            total=round(len(dataset) / batch_size)
+            total=len(dataloader) if not stream else None,
+            initial=skip,
+            disable=rank > 0
         )
 
-        for batch in dataloader:
-            X, y = batch
-            X.to(DEVICE)
+        batches = iter(dataloader)
+        for _ in range(skip):
+            next(batches, None)
+        if skip:
+            _set_rng_state(state['rng'])
+
+        # streamed shares may differ in length: replicas
+        # that run out of batches keep joining the gra-
+        # dients all-reduce until all of them are done.
+        joined = ddp.join() if replicas > 1 else nullcontext()
+
+        with joined:
+            for step, batch in enumerate(
+                telemetry.batches(batches), start=skip + 1
+            ):
+                X, y = batch
+                X.to(DEVICE)
+
+                # zero gradient
+
+                optimizer.zero_grad()
+
+                with torch.autocast(
+                    device_type=DEVICE.split(':')[0],
+                    dtype=torch.bfloat16,
+                    enabled=bf16
+                ):
+                    # forward-pass
 
-            # zero gradient
+                    with telemetry.stage('forward'):
+                        y_hat = model(X)
 
-            optimizer.zero_grad()
+                    # compute loss
 
-            # forward-pass
+                    with telemetry.stage('loss'):
+                        loss = criterion_(y_hat.float(), y)
 
-            y_hat = cg(X)
+                # back-prop
 
-            # compute loss
+                with telemetry.stage('backward'):
+                    loss.backward()
 
-            loss = criterion_(y_hat, y)
+                with telemetry.stage('step'):
+                    optimizer.step()
 
-            # back-prop
+                telemetry.step(epoch, step, len(y), loss.item(), lr)
 
-            loss.backward()
+                pbar.set_description(f' loss: {loss.item()}')
+                avg_epoch_loss.append(loss.item())
 
-            pbar.set_description(f' loss: {loss.item()}')
-            avg_epoch_loss.append(loss.item())
+                pbar.update(1)
 
-            optimizer.step()
+                if (
+                    checkpoint is not None and rank == 0 and
+                    checkpoint_every and step % checkpoint_every == 0
+                ):
+                    _save_checkpoint(
+                        checkpoint, cg, optimizer, scheduler,
+                        epoch, step, epoch_rng,
+                        iterations=epoch_iterations
+                    )
 
-            pbar.update(1)
+        scheduler.step()
+
+        timings, samples = telemetry.epoch()
+        seconds = sum(timings.values())
 
         avg_epoch_loss = np.mean(avg_epoch_loss)
         logger.info(f' Average Loss: {avg_epoch_loss}')
+        logger.info(
+            f' Epoch took {seconds:.2f}s ('
+            + ', '.join(
+                f'{stage}: {timing:.2f}s'
+                for stage, timing in timings.items()
+            )
+            + f'), {samples / max(seconds, 1e-9):.1f} samples/s, '
+            f'peak memory {telemetry.maxrss() or 0:.0f}MB'
+        )
+        valid_loss = None
+        if valid_loader is not None:
+            valid_loss = _validate(cg, valid_loader, criterion_)
+            logger.info(f' Validation Loss: {valid_loss}')
         pbar.close()
 
+        if checkpoint is not None and rank == 0:
+            _save_checkpoint(
+                checkpoint, cg, optimizer, scheduler,
+                epoch + 1, 0, _rng_state(),
+                iterations=getattr(dataset, 'iterations', 0)
+            )
+
+        if callback is not None and _stop(
+            rank == 0 and bool(callback(epoch, valid_loss)),
+            replicas
+        ) and epoch + 1 < epochs:
+            logger.info(f' stopping early, after epoch {epoch + 1}.')
+            break
+
+    telemetry.close()
+
+    if rank > 0:
+        return
+
     # save the model!
 
     output = os.path.join(output, 'color-generator')
@@ -177,6 +529,291 @@ def train(
     os.mkdir(output)
     cg.save (output)
 
+    return output
+
+
+def _stop(stop, replicas):
+    """
+    Shares rank 0's decision to stop training
+    with all the other replicas.
+
+    :param stop:
+    :param replicas:
+    :return:
+    """
+    if replicas > 1:
+        stop = torch.tensor(int(stop))
+        dist.broadcast(stop, src=0)
+        stop = bool(stop.item())
+
+    return stop
+
+
+def _distributed(rank, processes, port, settings):
+    """
+    Entry point of each training process: joins
+    the process group and trains on its share of
+    the data; logging is left to rank 0.
+
+    :param rank:
+    :param processes:
+    :param port:
+    :param settings: arguments of `train`.
+    :return:
+    """
+    if rank > 0:
+        logging.disable(logging.INFO)
+
+    dist.init_process_group(
+        'gloo',
+        init_method=f'tcp://127.0.0.1:{port}',
+        rank=rank,
+        world_size=processes
+    )
+    try:
+        train(**settings)
+    finally:
+        dist.destroy_process_group()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _rng_state():
+    return {
+        'torch': torch.get_rng_state(),
+        'numpy': np.random.get_state(),
+        'random': random.getstate()
+    }
+
+
+def _set_rng_state(state):
+    torch.set_rng_state(state['torch'])
+    np.random.set_state(state['numpy'])
+    random.setstate(state['random'])
+
+
+def _save_checkpoint(
+    checkpoint,
+    cg,
+    optimizer,
+    scheduler,
+    epoch,
+    step,
+    epoch_rng,
+    iterations=0
+):
+    """
+    Saves the training state after `step` batches
+    of `epoch` to `checkpoint/checkpoint.pt`; the
+    previous checkpoint is only replaced once the
+    new one is fully written.
+
+    :param checkpoint:
+    :param cg:
+    :param optimizer:
+    :param scheduler:
+    :param epoch:
+    :param step:
+    :param epoch_rng: RNG state at the start of the
+                      epoch, that its batches are
+                      drawn from.
+    :param iterations: iterations of the stream at
+                       the start of the epoch, that
+                       its shuffling is seeded by.
+    :return:
+    """
+    os.makedirs(checkpoint, exist_ok=True)
+
+    path = os.path.join(checkpoint, 'checkpoint.pt')
+    torch.save(
+        {
+            'epoch': epoch,
+            'step': step,
+            'model': cg.state_dict(),
+            'optimizer': optimizer.state_dict(),
+            'scheduler': scheduler.state_dict(),
+            'epoch_rng': epoch_rng,
+            'rng': _rng_state(),
+            'iterations': iterations
+        },
+        path + '.tmp'
+    )
+    os.replace(path + '.tmp', path)
+
+
+def _load_checkpoint(checkpoint):
+    path = os.path.join(checkpoint, 'checkpoint.pt')
+    if not os.path.isfile(path):
+        logger.warning(
+            f' no checkpoint found in {checkpoint}: '
+            f'will train from scratch.'
+        )
+        return None
+
+    logger.info(f' loading checkpoint from {path}...')
+
+    return torch.load(path, map_location='cpu', weights_only=False)
+
+
+def _configure_threads(threads, interop_threads):
+    """
+    Sets the number of threads used by torch within
+    ops (intra-op) and to run ops in parallel (inter-
+    op); zero leaves torch's defaults.
+
+    :param threads:
+    :param interop_threads:
+    :return:
+    """
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as ex:
+            # can only be set before any inter-op
+            # parallel work has been started.
+            logger.warning(
+                f' could not set inter-op threads ({ex})'
+            )
+
+    logger.info(
+        f' using {torch.get_num_threads()} intra-op and '
+        f'{torch.get_num_interop_threads()} inter-op threads'
+    )
+
+
+def _bf16_supported():
+    """
+    Whether the CPU has native bfloat16 support
+    (AVX512-BF16 or AMX); older torch builds do
+    not expose the check, and are assumed not to.
+
+    :return:
+    """
+    checks = [
+        getattr(torch.cpu, '_is_avx512_bf16_supported', None),
+        getattr(torch.cpu, '_is_amx_tile_supported', None)
+    ]
+
+    return any(check() for check in checks if check is not None)
+
+
+def _validate(cg, dataloader, criterion_):
+    """
+    Computes the average loss (in float32) of the
+    network over the validation data.
+
+    :param cg:
+    :param dataloader:
+    :param criterion_:
+    :return:
+    """
+    cg.eval()
+
+    total, samples = 0., 0
+    with torch.no_grad():
+        for X, y in dataloader:
+            total += criterion_(cg(X), y).item() * len(y)
+            samples += len(y)
+
+    cg.train(mode=True)
+
+    return total / samples
+
+
+def _lengths(dataset):
+    if isinstance(dataset, Subset):
+        return _lengths(dataset.dataset)[dataset.indices]
+
+    return dataset.lengths
+
+
+def _dataloader(
+    dataset,
+    batch_size,
+    bucket=False,
+    workers=0,
+    prefetch=2,
+    persistent=False,
+    replicas=1,
+    rank=0
+):
+    """
+    Builds the DataLoader feeding the training loop.
+    With `workers` > 0, batches are collated by as
+    many processes, `prefetch` batches ahead each,
+    while the model trains on the previous ones.
+
+    :param dataset:
+    :param batch_size:
+    :param bucket:
+    :param workers:
+    :param prefetch:
+    :param persistent: keep workers alive across epochs.
+    :param replicas: number of training processes;
+                     each gets a different share of
+                     every (shuffled) epoch.
+    :param rank: rank of this training process.
+    :return:
+    """
+    parallel = {}
+    if workers > 0:
+        parallel = {
+            'num_workers': workers,
+            'prefetch_factor': prefetch,
+            'persistent_workers': persistent,
+            'pin_memory': DEVICE.startswith('cuda')
+        }
+
+    # batches are padded to their longest
+    # name; when bucketing, names are ba-
+    # tched with names of similar length.
+    if isinstance(dataset, ColorStream):
+        return DataLoader(
+            dataset, batch_size,
+            collate_fn=ColorDataset.collate,
+            **parallel
+        )
+
+    if bucket:
+        return DataLoader(
+            dataset,
+            batch_sampler=BucketBatchSampler(
+                _lengths(dataset),
+                batch_size,
+                shuffle=True,
+                replicas=replicas,
+                rank=rank
+            ),
+            collate_fn=ColorDataset.collate,
+            **parallel
+        )
+
+    if replicas > 1:
+        return DataLoader(
+            dataset, batch_size,
+            sampler=DistributedSampler(
+                dataset,
+                num_replicas=replicas,
+                rank=rank,
+                shuffle=True
+            ),
+            collate_fn=ColorDataset.collate,
+            **parallel
+        )
+
+    return DataLoader(
+        dataset, batch_size,
+        shuffle=True,
+        collate_fn=ColorDataset.collate,
+        **parallel
+    )
+
 
 def argument_parser():
 
@@ -213,6 +850,14 @@ def argument_parser():
         action='store_true',
         help='Add word-bounds to n-gram features'
     )
+    parser.add_argument(
+        '--hashing',
+        default=defaults['hashing'],
+        type=int,
+        help='Hash n-grams to this many buckets'
+             ' per order, instead of building '
+             'lexicons (bounded memory, no fit)'
+    )
     parser.add_argument(
         '--lite',
         action='store_true',
@@ -222,6 +867,170 @@ def argument_parser():
              ' only max-order ngrams as feats '
              '(trains typically 5x faster)'
     )
+    parser.add_argument(
+        '--encoder',
+        default=None,
+        choices=ENCODERS,
+        help='Encoder of the ColorGenerator: b'
+             'ag encodes names as bags of ngr'
+             'ams, with no recurrence (overri'
+             'des --lite)'
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        default=defaults['jobs'],
+        type=int,
+        help='Number of processes used to pre'
+             'process (vectorize) the data'
+    )
+    parser.add_argument(
+        '--cache',
+        default=None,
+        help='Path to a folder where to cache '
+             'the preprocessed training data, '
+             'to skip preprocessing on re-runs'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Stream the data from the csv fi'
+             'les, rather than loading it all'
+             ' in memory (names are not dedu'
+             'plicated)'
+    )
+    parser.add_argument(
+        '--length',
+        default=defaults['length'],
+        type=int,
+        help='Length names are padded (or tri'
+             'mmed) to, when streaming'
+    )
+    parser.add_argument(
+        '--buffer',
+        default=defaults['buffer'],
+        type=int,
+        help='Size of the buffer used to shuf'
+             'fle the data, when streaming'
+    )
+    parser.add_argument(
+        '--bucket',
+        action='store_true',
+        help='Batch together names of similar '
+             'length, to cut down on padding'
+    )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        default=defaults['workers'],
+        type=int,
+        help='Number of processes loading the '
+             'batches while the model trains'
+    )
+    parser.add_argument(
+        '--prefetch',
+        default=defaults['prefetch'],
+        type=int,
+        help='Number of batches loaded ahead '
+             'by each worker'
+    )
+    parser.add_argument(
+        '--persistent',
+        action='store_true',
+        help='Keep the workers alive across e'
+             'pochs'
+    )
+    parser.add_argument(
+        '--validation',
+        default=defaults['validation'],
+        type=float,
+        help='Fraction of the data held out to'
+             ' compute a validation loss'
+    )
+    parser.add_argument(
+        '--threads',
+        default=defaults['threads'],
+        type=int,
+        help='Number of intra-op threads (0 f'
+             'or torch\'s default)'
+    )
+    parser.add_argument(
+        '--interop_threads',
+        default=defaults['interop_threads'],
+        type=int,
+        help='Number of inter-op threads (0 f'
+             'or torch\'s default)'
+    )
+    parser.add_argument(
+        '--bf16',
+        action='store_true',
+        help='Run forward pass and loss in bf'
+             'loat16, on CPUs that support it'
+    )
+    parser.add_argument(
+        '--compile',
+        dest='compile_',
+        action='store_true',
+        help='Compile the network with torch.'
+             'compile before training'
+    )
+    parser.add_argument(
+        '-p',
+        '--processes',
+        default=defaults['processes'],
+        type=int,
+        help='Number of processes training in'
+             ' parallel, each on its share of '
+             'the data (gloo backend)'
+    )
+    parser.add_argument(
+        '--checkpoint',
+        default=None,
+        help='Path to a folder where to check'
+             'point training after each epoch'
+    )
+    parser.add_argument(
+        '--checkpoint_every',
+        default=defaults['checkpoint_every'],
+        type=int,
+        help='Also checkpoint every this many '
+             'batches (0 to checkpoint after '
+             'each epoch only)'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume training from the checkp'
+             'oint, if there is one'
+    )
+    parser.add_argument(
+        '--metrics',
+        default=None,
+        help='Path to a file where per-step ti'
+             'mings, throughput, memory and lo'
+             'ss are written (JSONL, or CSV if '
+             'it ends with .csv)'
+    )
+    parser.add_argument(
+        '--trace',
+        default=None,
+        help='Path to a file where a profiler '
+             '(Chrome) trace of some steps is '
+             'written'
+    )
+    parser.add_argument(
+        '--trace_start',
+        default=defaults['trace_start'],
+        type=int,
+        help='Number of steps before the trace'
+             ' starts'
+    )
+    parser.add_argument(
+        '--trace_steps',
+        default=defaults['trace_steps'],
+        type=int,
+        help='Number of steps traced'
+    )
     parser.add_argument(
         '-e',
         '--epochs',
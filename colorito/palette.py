@@ -1,20 +1,34 @@
 from colorito import DEFAULT_PALETTE, DEFAULT_NETWORK
-from colorito.data.vectorize import NgramVectorizer
 from colorito.utils import Reader
-from colorito.nnet.model import ColorGenerator
+from colorito.nnet.registry import models
 from colorito.colors import Color
-from colorito.data.utils import encode
+from colorito.data.utils import clean, vectorize
+from colorito.index import FlatIndex, ProjectedIndex, PQIndex, BinaryIndex, recall
+from colorito.metrics import NullMetrics
+from colorito.utils.logs import setup_logger
 
-from sklearn.metrics.pairwise import cosine_similarity
 from kneed.knee_locator import KneeLocator
+from concurrent.futures import ThreadPoolExecutor
 
+import weakref
+import os
 import torch
-import numpy as np
+
+
+logger = setup_logger('palette')
 
 
 class SmartPalette(object):
 
-    def __init__(self, colors=DEFAULT_PALETTE, nnet=DEFAULT_NETWORK):
+    def __init__(
+        self,
+        colors=DEFAULT_PALETTE,
+        nnet=DEFAULT_NETWORK,
+        index='flat',
+        dim=None,
+        rerank=100,
+        metrics=None
+    ):
         """
         Initializes a SmartPalette over the provided
         list of colors.  The colors can be specified
@@ -27,7 +41,35 @@ class SmartPalette(object):
 
         :param nnet: path to neural network weights;
                      leave this unchanged for defaul-
-                     t network.
+                     t network. Palettes on the same
+                     network share one (read-only) c-
+                     opy of it (see `ModelRegistry`).
+
+        :param index: how colors' embeddings are ind-
+                      exed for search: `flat` (exact),
+                      `pca`/`random` to project them to
+                      `dim` dimensions, in float16 (see
+                      `ProjectedIndex`), `pq` to quant-
+                      ize them in `dim` bytes (see `PQ-
+                      Index`) or `binary` to hash them
+                      to `dim` bits (see `BinaryIndex`).
+
+        :param dim: size of the indexed embeddings (by
+                    default 32 dimensions, 16 bytes or
+                    256 bits, depending on `index`).
+
+        :param rerank: with an approximate index, how
+                       many of the best results are re-
+                       ranked by exact similarity (the
+                       exact embeddings are then kept
+                       too, in float32, unless zero);
+                       thresholds and the elbow method
+                       are applied to these results.
+
+        :param metrics: a `Metrics` object, to record
+                        how long each stage of `search`,
+                        `invent` and indexing takes (no-
+                        thing is recorded if None).
         """
 
         if isinstance(colors, list):
@@ -38,50 +80,99 @@ class SmartPalette(object):
                         colors)
             )
 
-        self.nnet = ColorGenerator.load(nnet)
-        n_ = len(self.nnet.encoder.lexicons_)
-        self.vectorz = NgramVectorizer(order=n_)
-        self.vectorz.lexicons = self.nnet.encoder.lexicons_
+        self.model = models.acquire(nnet)
+        self.nnet = self.model.nnet
+        self.vectorz = self.model.vectorizer
+
+        # the network is given back to the regi-
+        # stry when closing (or collecting) the
+        # palette:
+        self._release = weakref.finalize(
+            self, models.release, self.model)
 
-        self._index_colors()
+        self.rerank = rerank
+        self.metrics = metrics or NullMetrics()
+        self._index_colors(index, dim)
 
-    def _index_colors(self):
+    def _index_colors(self, index='flat', dim=None):
         """
         Indexes the colors in the palette, mapping
         their names to their hidden representation
 
+        :param index:
+        :param dim:
         :return:
         """
+        stage = self.metrics.stage
 
         col_to_vec = {
             color: vector for color, vector in zip(
                 self.colors,
-                encode(
-                    self.colors,
-                    self.vectorz
-                )
+                self._encode(self.colors, 'index')
             )
         }
 
         X = torch.stack(list(col_to_vec.values()))
-
-        self.index = {
-            name: {
-                'embed': h.numpy(),
-                'color': Color.from_lab(
-                    name,
-                    l.item(),
-                    a.item(),
-                    b.item(),
-                    unscale=True
+        with stage('index', 'forward'):
+            H = self.nnet.h(X)
+
+        self.names = list(col_to_vec.keys())
+        with stage('index', 'colors'):
+            self.index = {
+                name: {
+                    'color': Color.from_lab(
+                        name,
+                        l.item(),
+                        a.item(),
+                        b.item(),
+                        unscale=True
+                    )
+                }
+                for name, (l, a, b) in zip(
+                       self.names,
+                       self.nnet.y(X)
                 )
             }
-            for name, h, (l, a, b) in zip(
-                   list(col_to_vec.keys()),
-                   self.nnet.h(X),
-                   self.nnet( X )
+
+        # embeddings are kept in the search
+        # index, in the order of `names`:
+        self.recall = 1.
+        self.exact = None
+        with stage('index', 'index'):
+            if index == 'flat':
+                self.embeddings = FlatIndex(H)
+            elif index == 'pq':
+                self.embeddings = PQIndex(H, m=dim or 16)
+            elif index == 'binary':
+                self.embeddings = BinaryIndex(H, bits=dim or 256)
+            else:
+                self.embeddings = ProjectedIndex(H, dim=dim or 32, method=index)
+
+        self.metrics.count('index', 'colors', len(self.names))
+
+        if index != 'flat':
+            exact = FlatIndex(H)
+            if self.rerank:
+                # the best results are re-ranked
+                # by their exact embeddings:
+                self.exact = exact
+
+            # how many of the top results of the
+            # exact search the index keeps (bef-
+            # ore re-ranking):
+            with stage('index', 'recall'):
+                self.recall = recall(
+                    self.embeddings,
+                    exact,
+                    H[:1000],
+                    k=10
+                )
+            logger.info(
+                f' indexed {len(self.names)} colors in '
+                f'{self.embeddings.nbytes / 2**20:.2f}MB '
+                f'({self.embeddings.nbytes / len(self.names):.0f} '
+                f'bytes each), with a recall@10 of {self.recall:.3f}'
             )
-        }
 
     def search(self, name, **kwargs):
         """
@@ -102,35 +193,86 @@ class SmartPalette(object):
         :param kwargs:
         :return:
         """
-        color_embedding = self.nnet.h(
-            encode(name, self.vectorz)
-        ).squeeze(0).numpy()
-
-        distances = {
-            col: cosine_similarity(
-                np.array([color_embedding]),
-                np.array([vector['embed']])
-            )[0][0]
-            for col, vector in
-            self.index.items( )
-        }
+        return self.search_embedding(self.embed(name), **kwargs)
 
-        distances = sorted(
-            distances.items( ),
-            key=lambda x: x[1],
-            reverse=True
-        )
+    def embed(self, name):
+        """
+        Maps a color name to its hidden represen-
+        tation, that the palette is searched by.
+
+        :param name:
+        :return:
+        """
+        x = self._encode(name, 'search')
+        with self.metrics.stage('search', 'forward'):
+            return self.nnet.h(x)
 
-        if kwargs.get('t'):
-            result = self._threshold(
-                 distances, **kwargs)
-        elif kwargs.get('n'):
-            result = self._n_best(distances, **kwargs)
-        else:
-            result = self._infer(distances)
+    def search_embedding(self, color_embedding, **kwargs):
+        """
+        Searches the palette for colors similar to
+        an already embedded one (see `embed`); the
+        kwargs are the same as `search`'s.
 
-        colors = [self.index[col]['color'] for col, _ in result]
-        scores = [dist for _, dist in result]
+        :param color_embedding:
+        :param kwargs:
+        :return:
+        """
+        stage = self.metrics.stage
+
+        with stage('search', 'score'):
+            scores = self.embeddings.scores(color_embedding)
+
+        n_best = kwargs.get('n') and not kwargs.get('t')
+
+        # only the n best are needed, unless
+        # thresholding or inferring how many;
+        # approximate scores only shortlist
+        # the results to re-rank, so that all
+        # results are scored alike:
+        with stage('search', 'sort'):
+            if self.exact is not None:
+                scores, ix = scores.topk(min(
+                    len(self.embeddings),
+                    max(kwargs['n'], self.rerank) if n_best
+                    else self.rerank
+                ), dim=-1)
+            elif n_best:
+                scores, ix = scores.topk(min(
+                    len(self.embeddings),
+                    kwargs['n']
+                ), dim=-1)
+            else:
+                scores, ix = scores.sort(descending=True)
+
+        if self.exact is not None:
+            with stage('search', 'rerank'):
+                scores, ix = self._rerank(color_embedding, ix)
+
+        # thresholding, n-best or knee detection:
+        with stage('search', 'select'):
+            distances = [
+                (self.names[i], score) for i, score in
+                zip(ix[0].tolist(), scores[0].tolist())
+            ]
+
+            if kwargs.get('t'):
+                mode = 'threshold'
+                result = self._threshold(
+                     distances, **kwargs)
+            elif kwargs.get('n'):
+                mode = 'n_best'
+                result = self._n_best(distances, **kwargs)
+            else:
+                mode = 'knee'
+                result = self._infer(distances)
+
+        with stage('search', 'colors'):
+            colors = [self.index[col]['color'] for col, _ in result]
+            scores = [dist for _, dist in result]
+
+        self.metrics.count('search', 'calls')
+        self.metrics.count('search', f'{mode}_calls')
+        self.metrics.count('search', 'results', len(colors))
 
         return colors, scores
 
@@ -142,16 +284,62 @@ class SmartPalette(object):
         :param kwargs:
         :return:
         """
-        l, a, b = self.nnet.y(encode(
-                 name, self.vectorz)).squeeze(0)
+        x = self._encode(name, 'invent')
+        with self.metrics.stage('invent', 'forward'):
+            l, a, b = self.nnet.y(x).squeeze(0)
+
+        self.metrics.count('invent', 'calls')
+
+        with self.metrics.stage('invent', 'colors'):
+            return Color.from_lab(
+                name,
+                l.item(),
+                a.item(),
+                b.item(),
+                unscale=True
+            )
 
-        return Color.from_lab(
-            name,
-            l.item(),
-            a.item(),
-            b.item(),
-            unscale=True
-        )
+    def close(self):
+        """
+        Gives the network back to the registry, that
+        evicts it once no palette uses it anymore.
+
+        :return:
+        """
+        self._release()
+
+    def _encode(self, names, operation):
+        """
+        Cleans and vectorizes names (as `encode`),
+        timing the two stages of `operation`.
+
+        :param names:
+        :param operation:
+        :return:
+        """
+        names = [names] if isinstance(names, str) else list(names)
+
+        with self.metrics.stage(operation, 'clean'):
+            strings = list(clean(names))
+        with self.metrics.stage(operation, 'vectorize'):
+            return vectorize(strings, self.vectorz)
+
+    def _rerank(self, color_embedding, ix):
+        """
+        Re-ranks the shortlist of an approximate se-
+        arch by the exact similarity of its (stored)
+        embeddings to the searched color.
+
+        :param color_embedding:
+        :param ix:
+        :return:
+        """
+        candidates = self.exact.codes[ix[0]]
+        scores = self.exact.query(color_embedding) @ candidates.T
+
+        scores, order = scores.sort(descending=True)
+
+        return scores, ix[0][order[0]].unsqueeze(0)
 
     @staticmethod
     def _n_best(candidates, n=10):
@@ -175,3 +363,113 @@ class SmartPalette(object):
         ).knee + 1
 
         return [(col, dist) for col, dist in candidates[:knee_pt]]
+
+
+class PaletteCollection(object):
+
+    def __init__(self, palettes, jobs=None):
+        """
+        Searches several SmartPalettes (e.g. brand
+        palettes, the HTML one, vendor lists) at on-
+        ce: the searched name is cleaned, vectorized
+        and embedded once, then scored against the
+        index of each palette, in parallel.
+
+        All the palettes must share their network
+        (i.e. have been built on the same `nnet`).
+
+        :param palettes: dict mapping names to pal-
+                         ettes (or a list of them,
+                         named by position).
+
+        :param jobs: number of palettes scored in
+                     parallel (by default, up to
+                     one per core), by a pool of
+                     threads kept until `close`.
+        """
+        if not isinstance(palettes, dict):
+            palettes = {i: palette for i, palette in enumerate(palettes)}
+
+        if not palettes:
+            raise ValueError('Got no palettes to search.')
+
+        self.palettes = palettes
+        self.first = next(iter(palettes.values()))
+
+        if any(
+            palette.nnet is not self.first.nnet
+            for palette in palettes.values()
+        ):
+            raise ValueError(
+                'Palettes must share their network, to be'
+                ' searched with the same embedding.'
+            )
+
+        self.jobs = jobs or min(len(palettes), os.cpu_count() or 1)
+
+        # threads are started once, rather than
+        # on each search; they are stopped when
+        # closing (or collecting) the collection:
+        self.pool = ThreadPoolExecutor(max_workers=self.jobs)
+        self._shutdown = weakref.finalize(
+            self, self.pool.shutdown, wait=False)
+
+    def search(self, name, **kwargs):
+        """
+        Searches every palette for colors similar
+        to the specified one, with the kwargs of
+        `SmartPalette.search` (applied to each pa-
+        lette).
+
+        Returns the results of each palette (col-
+        ors and scores, by palette name) and their
+        merged ranking: colors, scores and the na-
+        mes of the palettes they come from, best
+        first (the `n` best, if `n` is given).
+
+        :param name:
+        :param kwargs:
+        :return:
+        """
+        color_embedding = self.first.embed(name)
+
+        def _search(palette):
+            return palette.search_embedding(color_embedding, **kwargs)
+
+        results = dict(zip(
+            self.palettes,
+            self.pool.map(_search, self.palettes.values())
+        ))
+
+        merged = sorted(
+            (
+                (score, color, palette)
+                for palette, (colors, scores) in results.items()
+                for color, score in zip(colors, scores)
+            ),
+            key=lambda result: result[0],
+            reverse=True
+        )
+        if kwargs.get('n') and not kwargs.get('t'):
+            merged = merged[:kwargs['n']]
+
+        colors = [color for _, color, _ in merged]
+        scores = [score for score, _, _ in merged]
+        sources = [palette for _, _, palette in merged]
+
+        return results, (colors, scores, sources)
+
+    def close(self):
+        """
+        Stops the threads of the collection (its pa-
+        lettes are left open).
+
+        :return:
+        """
+        self._shutdown()
+
+    def __getitem__(self, name):
+        return self.palettes[name]
+
+    def __len__(self):
+        return len(self.palettes)
@@ -14,7 +14,7 @@ setuptools.setup(
      long_description_content_type="text/markdown",
      url="https://github.com/kekgle/colorito",
      python_requires=">=3.0, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, !=3.4.*, != 3.5.*",
-     packages=setuptools.find_packages(),
+     packages=setuptools.find_packages(exclude=("benchmarks", "benchmarks.*")),
      # entry_points={"console_scripts": [
      #   'cmd = package.file:function'
      # ]},